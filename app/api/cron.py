@@ -1,18 +1,122 @@
 import os
-import pytz
+import hmac
+import asyncio
 from datetime import datetime, timedelta, time
-from fastapi import APIRouter, Depends, HTTPException
-from app.database import get_supabase
-from app.utils.sms import send_sms
-from supabase import Client
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header
+from app.database import get_storage
+from app.storage import Storage
+from app.utils.sms import send_sms_batch_async, is_failed
+from app.utils.sms_logs import insert_logs, logged_keys
+from app.utils import template_cache
+from app.utils.renderer import render_batch, TemplateError
+from app.utils import outbox, retry_queue
+from app.utils.metrics import SMS_MESSAGES
+from app.utils.profiling import phase, rounded, profiled, profile_top, ProfilerBusy
+from app.utils.sharding import ShardSpec
+from app.routers.admin import ADMIN_PIN
+from app.config import KST
+from app.utils.outbox import match_pairs, COMMON_ACCOMMODATION
 
 router = APIRouter(prefix="/api", tags=["cron"])
 
-# Strict Timezone Enforce
-KST = pytz.timezone('Asia/Seoul')
+# 최대 따라잡기 구간 (분)
+# 마지막 처리 시각(워터마크) 이후 ~ 현재까지를 한 번에 처리하되, 이보다 오래 지난 미발송 메시지는 보내지 않음
+# (cron 호출 간격보다 넉넉하게 설정)
+CRON_MAX_CATCHUP_MINUTES = int(os.environ.get("CRON_MAX_CATCHUP_MINUTES", "30"))
+
+# profile=true 응답에 포함할 상위 함수 수 최댓값
+CRON_PROFILE_MAX_TOP = 100
 
 @router.get("/cron")
-async def cron_job(manual_time: str = None, manual_date: str = None, supabase: Client = Depends(get_supabase)):
+async def cron_job(
+    manual_time: str = None,
+    manual_date: str = None,
+    profile: bool = False,
+    profile_top_n: int = 20,
+    shard: int = 0,
+    shards: int = 1,
+    shard_by: str = "reservation",
+    x_admin_pin: Optional[str] = Header(None),
+    storage: Storage = Depends(get_storage)
+):
+    # [분할] shard=i&shards=n 이면 발송 대상 중 i 번째 몫만 처리 (n 개 호출을 병렬로 실행, app/utils/sharding.py)
+    try:
+        shard_spec = ShardSpec(shard, shards, shard_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # [진단] profile=true 이면 틱 전체를 cProfile 로 측정해서 상위 함수 목록을 응답에 포함 (관리자 PIN 필요)
+    if profile:
+        # 비 ASCII 문자열은 compare_digest 에서 TypeError 이므로 bytes 로 비교
+        if not x_admin_pin or not hmac.compare_digest(x_admin_pin.encode(), ADMIN_PIN.encode()):
+            raise HTTPException(status_code=403, detail="Admin PIN required for profiling")
+        try:
+            with profiled() as profiler:
+                result = await run_tick(manual_time, manual_date, storage, shard_spec)
+        except ProfilerBusy:
+            raise HTTPException(status_code=409, detail="Another profile is already running")
+        result["profile"] = profile_top(profiler, max(1, min(profile_top_n, CRON_PROFILE_MAX_TOP)))
+        return result
+
+    return await run_tick(manual_time, manual_date, storage, shard_spec)
+
+@router.get("/cron/retry")
+async def retry_job(storage: Storage = Depends(get_storage)):
+    # 발송 실패 메시지 재시도 (cron 틱과 별도로 호출 - 틱 지연 없이 재시도 시각이 된 메시지를 배치로 재발송)
+    return await run_retries(storage)
+
+async def run_retries(storage):
+    timings = {}
+    now_kst = datetime.now(KST)
+
+    with phase(timings, "claim"):
+        claimed = await retry_queue.claim_due(storage, now_kst)
+
+    # 발송일이 지났거나 너무 오래된 메시지는 보내지 않음
+    expired, rows = [], []
+    for row in claimed:
+        (expired if retry_queue.is_expired(row, now_kst) else rows).append(row)
+    if expired:
+        with phase(timings, "expire"):
+            await retry_queue.expire(storage, expired)
+
+    summary = {"sent": 0, "rescheduled": 0, "gave_up": 0, "unclear": 0}
+    if rows:
+        # 같은 예약자의 메시지는 원래 순서대로 (차수별 발송)
+        results = [None] * len(rows)
+        for wave in guest_waves([row['reservation_id'] for row in rows]):
+            batch = [
+                {"to": rows[idx]['phone_number'], "text": rows[idx]['content'], "subject": rows[idx]['subject']}
+                for idx in wave
+            ]
+            for idx in wave:
+                print(f"[SMS RETRY] reservation_id={rows[idx]['reservation_id']}, trigger={rows[idx]['trigger_type']}, attempt={rows[idx]['attempts'] + 1}")
+            with phase(timings, "send"):
+                wave_results = await send_sms_batch_async(batch)
+            for idx, result in zip(wave, wave_results):
+                results[idx] = result
+
+        for row, result in zip(rows, results):
+            SMS_MESSAGES.inc(trigger_type=row['trigger_type'], result='failed' if is_failed(result) else 'sent')
+        with phase(timings, "record"):
+            summary = await retry_queue.record_results(storage, rows, results, now_kst)
+
+    return {
+        "status": "ok",
+        "server_time_kst": str(now_kst),
+        "claimed": len(claimed),
+        "expired": len(expired),
+        **summary,
+        "timings_ms": rounded(timings)
+    }
+
+async def run_tick(manual_time, manual_date, storage, shard_spec=None):
+    # 단계별 경과 시간 (ms) - 응답의 timings_ms
+    timings = {}
+    shard_spec = shard_spec or ShardSpec()
+    watermark_name = shard_spec.state_name(outbox.CRON_STATE_NAME)
+
     # 1. 현재 시간 (KST) 구하기
     now_kst = datetime.now(KST)
     
@@ -37,144 +141,285 @@ async def cron_job(manual_time: str = None, manual_date: str = None, supabase: C
     current_time_str = now_kst.strftime("%H:%M") # "09:00" 분 단위까지만
     today_date = now_kst.date()
     
-    # 2. 템플릿 가져오기 (전체 로드 - 데이터 크기 작음)
-    templates_res = supabase.table("message_templates").select("*").execute()
-    templates = templates_res.data
-    
-    # 3. '활성 예약' 가져오기 (입실일 <= 오늘 <= 퇴실일)
-    # Supabase 쿼리 제한으로 인해 범위로 넉넉히 가져와서 코드 레벨 필터링이 안전할 수 있음
-    # 하지만 여기선 lte/gte 로 최대한 필터링
-    active_reservations_res = supabase.table("reservations").select("*")\
-        .lte("checkin_date", str(today_date))\
-        .gte("checkout_date", str(today_date))\
-        .execute()
-        
-    reservations = active_reservations_res.data
-    
-    processed_count = 0
-    skipped_count = 0
-
-    for res in reservations:
-        checkin_date = datetime.strptime(res['checkin_date'], '%Y-%m-%d').date()
-        checkout_date = datetime.strptime(res['checkout_date'], '%Y-%m-%d').date()
-        
-        # 예약자별 적용 가능한 트리거 후보군 선정
-        candidate_triggers = []
-        
-        # (1) 입실일 당일
-        if checkin_date == today_date:
-            candidate_triggers.extend([t for t in templates if 'checkin' in t['trigger_type']])
-            
-        # (2) 퇴실일 당일
-        if checkout_date == today_date:
-            candidate_triggers.extend([t for t in templates if 'checkout' in t['trigger_type']])
-            
-        # (3) 연박 (입실일 < 오늘 < 퇴실일)
-        if checkin_date < today_date < checkout_date:
-            candidate_triggers.extend([t for t in templates if 'multinight' in t['trigger_type']])
-            
-        # (4) 숙소 이름 일치 여부 필터링 (공통메세지 포함)
-        # [Customer Request] '공통메세지'는 모든 숙소(초원고택1~3, 별장(시네/정글), 브릿지)에 적용됨
-        res_accommodation = res['accommodation_name']
-        candidate_triggers = [
-            t for t in candidate_triggers 
-            if t['accommodation_name'] == res_accommodation or t['accommodation_name'] == '공통메세지'
-        ]
-        
-        # [NEW] 실행 순서 보장을 위해 정렬 (trigger_type 기준 오름차순)
-        # checkin_0900 (맛집) -> checkin_0901 (체크인안내) 순서 보장됨
-        candidate_triggers.sort(key=lambda x: x['trigger_type'])
-
-        for tmpl in candidate_triggers:
-            # 4. 시간 비교 (분 단위 일치 여부)
-            # tmpl['send_time'] (e.g. "09:00:00")
-            tmpl_hm = tmpl['send_time'][:5] # "09:00"
-            
-            if tmpl_hm == current_time_str:
-                # 시간 일치! 중복 체크 및 발송 시도
-                result = await process_sending(supabase, res, tmpl, now_kst)
-                if result:
-                    processed_count += 1
-                else:
-                    skipped_count += 1
-            else:
-                # 시간 불일치 - 패스
-                continue
+    outbox_ids = []
+    held_rows = []
+    window_start = window_end = None
+
+    # 1단계: 발송 대상 (예약, 템플릿) 조합 선정
+    if manual_time or manual_date:
+        # [TEST] 수동 시간 지정 시에는 outbox 와 무관하게 해당 분의 발송 대상을 즉석 계산
+        # 2. 템플릿 가져오기 (프로세스 캐시 - 변경 시에만 재조회)
+        with phase(timings, "templates"):
+            all_templates = await template_cache.get_templates(storage)
+        with phase(timings, "matching"):
+            templates = due_templates(all_templates, current_time_str)
+        with phase(timings, "reservations"):
+            reservations = await fetch_candidate_reservations(storage, templates, today_date)
+        with phase(timings, "matching"):
+            reservations = [res for res in reservations if shard_spec.owns(res)]
+            pairs = match_pairs(reservations, templates, today_date)
+    else:
+        # 3. 마지막 처리 시각(워터마크) ~ 현재 구간의 미발송 outbox 메시지 조회
+        # (호출이 늦거나 건너뛰어져도 다음 호출에서 누락분을 함께 처리)
+        # 템플릿과 워터마크는 서로 독립적이므로 동시 조회
+        with phase(timings, "templates"):
+            all_templates, watermark = await asyncio.gather(
+                template_cache.get_templates(storage),
+                outbox.get_watermark(storage, watermark_name)
+            )
+        window_end = now_kst
+        window_start = now_kst - timedelta(minutes=CRON_MAX_CATCHUP_MINUTES)
+        if watermark and watermark > window_start:
+            window_start = watermark
+        with phase(timings, "reservations"):
+            due_rows = await outbox.fetch_due(storage, window_start, window_end)
+        with phase(timings, "matching"):
+            due_rows = [row for row in due_rows if shard_spec.owns(row.get('reservations'))]
+        # 겹쳐 실행된 다른 틱(늦어진 틱 + 다음 틱, 수동 호출 등)과 같은 행을 보내지 않도록 선점한 행만 발송
+        with phase(timings, "claim"):
+            due_rows, held_rows = await outbox.claim_due(storage, due_rows, now_kst)
+        with phase(timings, "matching"):
+            pairs, outbox_ids = outbox_pairs(due_rows, all_templates)
+
+    # 오늘 이미 로그가 있는 조합은 발송 전에 제외 (로그 1회 조회 + 메모리 집합 비교)
+    with phase(timings, "dedup"):
+        pairs, duplicates = await drop_logged_pairs(storage, pairs, today_date)
+    for res, tmpl in duplicates:
+        SMS_MESSAGES.inc(trigger_type=tmpl['trigger_type'], result='skipped')
+
+    # 2단계: 템플릿별 일괄 렌더링 (잘못된 템플릿은 해당 조합만 제외)
+    with phase(timings, "render"):
+        messages, render_failed = render_messages(pairs)
+    for failed in render_failed:
+        SMS_MESSAGES.inc(failed['reservations'], trigger_type=failed['trigger_type'], result='skipped')
+
+    # 3단계: 일괄 발송 및 로그 기록
+    statuses = await dispatch_messages(storage, messages, now_kst, timings)
+
+    # 처리한 outbox 행은 발송 완료로 표시 (렌더링 실패/로그 실패 포함 - 재발송 방지)
+    with phase(timings, "outbox_update"):
+        if outbox_ids:
+            await outbox.mark_sent(storage, outbox_ids, now_kst)
+        # 구간 처리가 끝났으므로 워터마크 전진
+        # 다른 틱이 선점 중인 행이 있으면 그 행 앞까지만 (그 틱이 중단돼도 선점 만료 후 다음 틱이 처리)
+        if window_end:
+            watermark = window_end
+            if held_rows:
+                watermark = min(datetime.fromisoformat(row['send_at']) for row in held_rows)
+            await outbox.set_watermark(storage, watermark, watermark_name)
+
+    processed_count = statuses.count('inserted')
+    # 발송 전에 걸러진 조합 + 로그 기록 시점에 중복으로 확인된 조합 (동시에 실행된 다른 틱과 겹친 경우)
+    skipped_count = len(duplicates) + statuses.count('duplicate')
+    log_failed = [
+        {"reservation_id": msg['reservation']['id'], "trigger_type": msg['trigger_type']}
+        for msg, status in zip(messages, statuses) if status == 'failed'
+    ]
 
     return {
         "status": "ok", 
         "server_time_kst": str(now_kst), 
         "match_minute": current_time_str,
+        "shard": shard_spec.as_dict(),
+        "window_start": str(window_start) if window_start else None,
+        "window_end": str(window_end) if window_end else None,
         "processed": processed_count,
-        "skipped_duplicate": skipped_count
+        "skipped_duplicate": skipped_count,
+        "log_failed": log_failed,
+        "render_failed": render_failed,
+        "timings_ms": rounded(timings)
     }
 
-async def process_sending(supabase, reservation, template, now_kst):
+def due_templates(templates, current_time_str):
     """
-    중복 발송 방지 및 실제 문자 발송 처리 검증
+    send_time 이 현재 분(HH:MM)과 일치하는 템플릿만 반환
     """
-    trigger_type = template['trigger_type']
-    reservation_id = reservation['id']
-    
-    # [Critical] 중복 방지 체크
-    # 조건: reservation_id AND trigger_type AND sent_at(오늘 날짜)
-    today_start = now_kst.strftime("%Y-%m-%d 00:00:00")
-    today_end = now_kst.strftime("%Y-%m-%d 23:59:59")
-    
-    # [Customer Request] 중복 발송 제한 해제 (2026-02-10)
-    # check_log = supabase.table("sms_logs").select("id")\
-    #     .eq("reservation_id", reservation_id)\
-    #     .eq("trigger_type", trigger_type)\
-    #     .gte("sent_at", today_start)\
-    #     .lte("sent_at", today_end)\
-    #     .execute()
-        
-    # if check_log.data and len(check_log.data) > 0:
-    #     return False
-
-    # 메시지 내용 포맷팅
-    content = template['content'].format(
-        name=reservation['guest_name'],
-        accommodation=reservation['accommodation_name']
+    # tmpl['send_time'] (e.g. "09:00:00")
+    return [t for t in templates if t['send_time'][:5] == current_time_str]
+
+async def fetch_candidate_reservations(storage, templates, today_date):
+    """
+    템플릿 카테고리(입실/퇴실/연박)와 숙소에 해당하는 예약만 DB 에서 조회.
+    보낼 템플릿이 없으면 쿼리하지 않음.
+    """
+    if not templates:
+        return []
+
+    # 공통메세지가 없으면 템플릿이 있는 숙소만 조회
+    accommodations = {t['accommodation_name'] for t in templates}
+    if COMMON_ACCOMMODATION in accommodations:
+        accommodations = None
+
+    return await storage.reservations_for_day(
+        today_date,
+        checkin=any('checkin' in t['trigger_type'] for t in templates),
+        checkout=any('checkout' in t['trigger_type'] for t in templates),
+        multinight=any('multinight' in t['trigger_type'] for t in templates),
+        accommodations=accommodations
     )
-    
-    subject = template.get('subject') # [NEW] 템플릿에서 제목 가져오기
-    formatted_subject = None
-    if subject:
+
+def outbox_pairs(due_rows, templates):
+    """
+    outbox 행을 (예약, 템플릿) 조합으로 변환. (발송 시각, trigger_type 순으로 정렬)
+    반환값: (조합 리스트, 처리한 outbox id 리스트)
+    """
+    templates_by_id = {t['id']: t for t in templates}
+    rows = sorted(due_rows, key=lambda r: (r['send_at'], r['trigger_type']))
+
+    pairs = []
+    for row in rows:
+        tmpl = templates_by_id.get(row['template_id'])
+        res = row.get('reservations')
+        if tmpl and res:
+            pairs.append((res, tmpl))
+    return pairs, [row['id'] for row in rows]
+
+async def drop_logged_pairs(storage, pairs, sent_date):
+    """
+    sent_date 에 이미 로그가 있는 (예약, trigger_type) 조합과 같은 틱 안에서 반복된 조합을 제외.
+    조합 수와 상관없이 로그 조회는 1회 (이번 틱의 trigger_type 들로 조회)
+    반환값: (남은 조합 리스트, 제외된 조합 리스트)
+    """
+    if not pairs:
+        return pairs, []
+
+    seen = await logged_keys(storage, sent_date, {tmpl['trigger_type'] for _, tmpl in pairs})
+    kept, dropped = [], []
+    for res, tmpl in pairs:
+        key = (res['id'], tmpl['trigger_type'])
+        if key in seen:
+            dropped.append((res, tmpl))
+            continue
+        seen.add(key)
+        kept.append((res, tmpl))
+    return kept, dropped
+
+def render_messages(pairs):
+    """
+    (예약, 템플릿) 조합들을 템플릿별로 묶어 컴파일된 렌더러로 일괄 렌더링한다.
+    반환값: (발송 단위 메시지 리스트(pairs 순서 유지), 렌더링 실패 목록)
+    """
+    by_template = {}
+    for idx, (res, tmpl) in enumerate(pairs):
+        by_template.setdefault(tmpl['id'], []).append(idx)
+
+    rendered = [None] * len(pairs)
+    render_failed = []
+    for indices in by_template.values():
+        tmpl = pairs[indices[0]][1]
         try:
-            formatted_subject = subject.format(
-                name=reservation['guest_name'],
-                accommodation=reservation['accommodation_name']
-            )
-        except Exception:
-            formatted_subject = subject
+            outputs = render_batch(tmpl, [pairs[idx][0] for idx in indices])
+        except TemplateError as e:
+            print(f"[TEMPLATE ERROR] id={tmpl['id']} ({tmpl['trigger_type']}): {e}")
+            render_failed.append({
+                "template_id": tmpl['id'],
+                "trigger_type": tmpl['trigger_type'],
+                "reservations": len(indices),
+                "error": str(e)
+            })
+            continue
+        for idx, output in zip(indices, outputs):
+            rendered[idx] = output
 
-    print(f"[SMS SENDING] To: {reservation['guest_name']}, Subject: {formatted_subject}, Msg: {content[:20]}...")
-    
-    # SMS 발송 (Mock 또는 Real)
-    send_result = send_sms(reservation['phone_number'], content, subject=formatted_subject)
+    messages = []
+    for (res, tmpl), output in zip(pairs, rendered):
+        if output is None:
+            continue
+        content, subject = output
+        messages.append({
+            "reservation": res,
+            "trigger_type": tmpl['trigger_type'],
+            "content": content,
+            "subject": subject
+        })
+    return messages, render_failed
+
+async def dispatch_messages(storage, messages, now_kst, timings=None):
+    """
+    렌더링된 메시지를 Solapi send-many 로 묶어서 발송한다.
+    - 같은 예약자의 메시지는 trigger_type 순서를 지키도록 차수(wave)를 나눠 발송
+      (1차: 예약자별 첫 메시지, 2차: 두 번째 메시지 ...)
+    - 발송 후 로그는 모아서 bulk insert, 발송 실패 메시지는 재시도 큐에 저장
+    결과는 messages 와 같은 순서의 로그 기록 상태 리스트 ('inserted' / 'duplicate' / 'failed')
+    timings 를 주면 발송(send) / 로그 기록(log_write) 시간(ms)을 누적
+    """
+    if not messages:
+        return []
+    timings = {} if timings is None else timings
+
+    send_results = [None] * len(messages)
+    for wave in guest_waves([msg['reservation']['id'] for msg in messages]):
+        batch = [
+            {
+                "to": messages[idx]['reservation']['phone_number'],
+                "text": messages[idx]['content'],
+                "subject": messages[idx]['subject']
+            }
+            for idx in wave
+        ]
+        for msg in (messages[idx] for idx in wave):
+            print(f"[SMS SENDING] To: {msg['reservation']['guest_name']}, Subject: {msg['subject']}, Msg: {msg['content'][:20]}...")
+        with phase(timings, "send"):
+            wave_results = await send_sms_batch_async(batch)
+        for idx, result in zip(wave, wave_results):
+            send_results[idx] = result
+
+    # 로그는 틱 동안 모아서 한 번에 bulk insert
+    log_rows = [build_log_row(messages[idx], send_results[idx], now_kst) for idx in range(len(messages))]
+    for row in log_rows:
+        SMS_MESSAGES.inc(trigger_type=row['trigger_type'], result='sent' if row['status'] == 'success' else 'failed')
+    with phase(timings, "log_write"):
+        statuses = await insert_logs(storage, log_rows)
+
+    for row, status in zip(log_rows, statuses):
+        if status == 'failed':
+            print(f"Error inserting log: reservation_id={row['reservation_id']}, trigger={row['trigger_type']}")
+
+    # 발송 실패 메시지는 재시도 큐에 저장 (재발송은 /api/cron/retry 에서)
+    retry_rows = retry_queue.build_retry_rows(messages, send_results, log_rows, statuses, now_kst)
+    if retry_rows:
+        with phase(timings, "retry_enqueue"):
+            await retry_queue.enqueue(storage, retry_rows)
+
+    return statuses
+
+def guest_waves(reservation_ids):
+    """
+    예약자별 몇 번째 메시지인지로 차수(wave)를 나눈 인덱스 리스트 (입력 순서 유지)
+    (1차: 예약자별 첫 메시지, 2차: 두 번째 메시지 ...)
+    """
+    waves = []
+    seen = {}
+    for idx, reservation_id in enumerate(reservation_ids):
+        order = seen.get(reservation_id, 0)
+        seen[reservation_id] = order + 1
+        if order == len(waves):
+            waves.append([])
+        waves[order].append(idx)
+    return waves
+
+def build_log_row(message, send_result, now_kst):
+    """
+    중복 발송 방지 및 발송 결과 로그 행 생성
+    """
+    reservation = message['reservation']
+    trigger_type = message['trigger_type']
+    reservation_id = reservation['id']
     
+    # [Critical] 중복 방지 체크
+    # 조건: reservation_id AND trigger_type AND sent_date(오늘 날짜)
+    # 발송 전에 run_tick 의 drop_logged_pairs 에서 걸러냄 (틱당 로그 조회 1회)
+    # (동시에 실행된 틱과 겹친 행은 sms_logs 의 unique 제약조건으로 insert_logs 에서 'duplicate' 로 처리됨)
+
     # 성공 여부 판단
-    status = 'success'
-    if isinstance(send_result, dict) and ('error' in send_result or send_result.get('status') == 'error'):
-        status = 'failed'
+    status = 'failed' if is_failed(send_result) else 'success'
     
-    # 로그 기록 (성공 여부 상관없이 시도했으면 기록하여 무한 재시도 방지 - 실패시 처리는 별도 정책 필요하지만 여기선 중복방지 우선)
-    # 실패했더라도 재시도 로직이 없으면 'failed'로 남겨서 오늘 다시 안보내게 하는게 안전할 수 있음 (또는 status='failed'는 재시도 대상이 될 수도)
-    # 요구사항: "중복 발송 절대 방지" -> 실패했어도 오늘 기록 남기는게 안전.
-    
-    # insert log
-    log_data = {
+    # 로그 기록 (성공 여부 상관없이 시도했으면 기록하여 틱에서 다시 보내지 않음 - 요구사항: "중복 발송 절대 방지")
+    # 실패한 메시지는 재시도 큐(/api/cron/retry)에서 다시 보내고 결과를 이 로그 행에 반영
+    return {
         "reservation_id": reservation_id,
         "trigger_type": trigger_type,
         "sent_at": str(now_kst), 
         "sent_date": str(now_kst.date()), # [추가] DB Unique 제약조건 대응
         "status": status
     }
-    
-    try:
-        supabase.table("sms_logs").insert(log_data).execute()
-        return True
-    except Exception as e:
-        print(f"Error inserting log: {e}")
-        return False
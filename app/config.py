@@ -0,0 +1,10 @@
+from datetime import timezone, timedelta
+from dotenv import load_dotenv
+
+# 공통 설정
+# - .env 파일은 여기서 한 번만 로드 (환경 변수를 읽는 모듈은 이 모듈을 먼저 import)
+load_dotenv()
+
+# 한국 표준시 (UTC+9, 일광절약시간 없음)
+# pytz 시간대 파일을 읽지 않는 고정 오프셋이라 import 비용이 없음 (cold start 단축)
+KST = timezone(timedelta(hours=9), "KST")
@@ -1,17 +1,51 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
-
-load_dotenv()
+import asyncio
+from app import config  # .env 로드
+from app.storage import Storage
+from app.storage.instrumented import InstrumentedStorage
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 
-if not url:
+# 저장소 종류: supabase (기본) / sqlite (Supabase 없이 로컬 실행, 벤치마크용)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase")
+# sqlite 저장소 파일 경로 (":memory:" 이면 프로세스 메모리에만 유지)
+SQLITE_PATH = os.environ.get("SQLITE_PATH", ":memory:")
+
+if STORAGE_BACKEND == "supabase" and not url:
     # Vercel 환경에서는 .env 파일이 없을 수 있으므로 os.environ에서 직접 읽어올 수도 있음 (이미 위에서 처리함)
     print("Warning: SUPABASE_URL not set.")
 
-supabase: Client = create_client(url, key) if url and key else None
+# 저장소 (첫 get_storage 호출 시 생성, 앱 lifespan 종료 시 닫음)
+# Supabase 는 비동기 클라이언트를 사용하므로 DB 왕복 동안 이벤트 루프가 막히지 않음
+# 모든 호출 시간은 /metrics 의 storage_query_duration_seconds 로 기록
+storage: Storage = None
+# cold start 에 동시에 들어온 첫 요청들이 클라이언트를 각자 만들지 않도록 잠금 (하나만 남고 나머지는 닫히지 않음)
+_storage_lock = asyncio.Lock()
+
+async def open_storage() -> Storage:
+    global storage
+    if storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            from app.storage.sqlite_store import SQLiteStorage
+            storage = InstrumentedStorage(SQLiteStorage(SQLITE_PATH), "sqlite")
+        elif url and key:
+            from app.storage.supabase_store import SupabaseStorage
+            storage = InstrumentedStorage(await SupabaseStorage.create(url, key), "supabase")
+    return storage
+
+async def close_storage():
+    global storage
+    if storage is not None:
+        try:
+            await storage.close()
+        except Exception as e:
+            print(f"Error closing storage: {e}")
+        storage = None
 
-def get_supabase() -> Client:
-    return supabase
+async def get_storage() -> Storage:
+    # 첫 요청에서 지연 생성 (import / 앱 시작 시점에는 클라이언트를 만들지 않음)
+    if storage is not None:
+        return storage
+    async with _storage_lock:
+        return await open_storage()
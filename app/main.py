@@ -1,20 +1,46 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from app.routers import reservations, templates as templates_router, admin
 from app.api import cron
-import os
+from app.utils import sms as sms_client
+from app.utils import metrics
+from app import database, templating
+from contextlib import asynccontextmanager
+import time
 
-app = FastAPI(title="ChowonSMS", description="Automatic SMS System for accommodation reservation")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 저장소 (Supabase 비동기 클라이언트 / 로컬 SQLite), Solapi 비동기 HTTP 클라이언트 (커넥션 풀) 종료
+    # 생성은 첫 사용 시점 (get_storage / get_async_client) 으로 미룸
+    # - cold start 에서 바로 응답할 수 있고, 쓰지 않는 요청은 클라이언트를 만들지 않음
+    yield
+    await sms_client.close_async_client()
+    await database.close_storage()
 
-# Static files mount
-if not os.path.exists("static"):
-    os.makedirs("static")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app = FastAPI(title="ChowonSMS", description="Automatic SMS System for accommodation reservation", lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    # 라우트(경로 템플릿)별 요청 시간 기록 (/metrics)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# Static files mount
+# static 디렉터리는 저장소에 포함되어 있으므로 import 시점에 생성/확인하지 않음 (읽기 전용 파일시스템 대응)
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
 # Include Routers
 app.include_router(reservations.router)
@@ -25,6 +51,11 @@ from app.routers import sms
 app.include_router(sms.router)
 app.include_router(sms.admin_router)
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    # Prometheus 텍스트 형식
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("reservations.html", {"request": request})
+    return templating.render(request, "reservations.html")
@@ -1,20 +1,17 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, Body
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse, HTMLResponse
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from app import config  # .env 로드
+from app import templating
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-templates = Jinja2Templates(directory="templates")
 
 # 환경 변수에서 PIN 로드 (기본값 설정은 개발 편의상, 배포시는 필수)
 ADMIN_PIN = os.environ.get("ADMIN_PIN", "0000")
 
 @router.get("/", response_class=HTMLResponse)
 async def admin_page(request: Request):
-    return templates.TemplateResponse("admin.html", {"request": request})
+    return templating.render(request, "admin.html")
 
 @router.post("/verify-pin")
 async def verify_pin(payload: dict = Body(...)):
@@ -26,4 +23,4 @@ async def verify_pin(payload: dict = Body(...)):
 
 @router.get("/sms-logs", response_class=HTMLResponse)
 async def sms_logs_page(request: Request):
-    return templates.TemplateResponse("sms_logs.html", {"request": request})
+    return templating.render(request, "sms_logs.html")
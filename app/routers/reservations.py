@@ -1,62 +1,170 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.database import get_supabase
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from datetime import date
+from typing import Optional, List
+from app.database import get_storage
+from app.storage import Storage, OverlapError
 from app.models import ReservationCreate, Reservation
-from supabase import Client
+from app.utils import outbox, template_cache, interval_index, reservation_import
+from app.utils.etag import make_etag, not_modified, etag_response
+from app.utils.csv_export import csv_response, EXPORT_CHUNK_SIZE
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
 @router.get("/", response_model=list[dict])
-async def get_reservations(supabase: Client = Depends(get_supabase)):
-    response = supabase.table("reservations").select("*").order("checkin_date", desc=False).execute()
-    return response.data
+async def get_reservations(
+    request: Request,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    accommodation: Optional[List[str]] = Query(None),
+    storage: Storage = Depends(get_storage)
+):
+    # 변경이 없으면 304 (달력 새로고침 시 재다운로드 방지)
+    etag = make_etag(request, await storage.table_version("reservations"))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # FullCalendar 가 보내는 표시 구간(start/end, ISO 형식)과 숙소 목록으로 DB 에서 필터링
+    # 구간과 겹치는 예약: checkin < end AND checkout > start
+    try:
+        start_date = date.fromisoformat(start[:10]) if start else None
+        end_date = date.fromisoformat(end[:10]) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start/end format. Use YYYY-MM-DD")
+
+    rows = await storage.list_reservations(start_date, end_date, accommodation)
+    return etag_response(rows, etag)
+
+RESERVATION_EXPORT_COLUMNS = ["id", "guest_name", "phone_number", "accommodation_name",
+                              "checkin_date", "checkout_date", "memo", "created_at"]
+
+@router.get("/export.csv")
+async def export_reservations(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    accommodation: Optional[List[str]] = Query(None),
+    storage: Storage = Depends(get_storage)
+):
+    # id 기준 keyset 으로 청크 단위 조회하면서 CSV 로 스트리밍
+    async def pages():
+        last_id = 0
+        while True:
+            rows = await storage.reservation_page(last_id, EXPORT_CHUNK_SIZE, start, end, accommodation)
+            if not rows:
+                break
+            yield rows
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                break
+            last_id = rows[-1]['id']
+
+    return csv_response(RESERVATION_EXPORT_COLUMNS, pages(), "reservations.csv")
 
 from fastapi.encoders import jsonable_encoder
 
 @router.post("/", response_model=dict)
-async def create_reservation(reservation: ReservationCreate, supabase: Client = Depends(get_supabase)):
+async def create_reservation(reservation: ReservationCreate, storage: Storage = Depends(get_storage)):
     data = jsonable_encoder(reservation)
     
     # Validation: Check for Overlapping Reservations
     # Same accommodation
     # Overlap: (existing.checkin < new.checkout) AND (existing.checkout > new.checkin)
     
-    existing = supabase.table("reservations").select("*") \
-        .eq("accommodation_name", reservation.accommodation_name) \
-        .lt("checkin_date", reservation.checkout_date) \
-        .gt("checkout_date", reservation.checkin_date) \
-        .execute()
-
-    if existing.data:
+    # (숙소별 구간 인덱스로 검사 - DB 조회 없음, 최종 보장은 DB exclusion 제약조건)
+    if await interval_index.overlaps(storage, reservation.accommodation_name, reservation.checkin_date, reservation.checkout_date):
         raise HTTPException(status_code=400, detail="이미 예약된 날짜입니다.")
 
-    response = supabase.table("reservations").insert(data).execute()
-    if not response.data:
+    try:
+        row = await storage.insert_reservation(data)
+    except OverlapError:
+        raise_overlap()
+    if not row:
         raise HTTPException(status_code=400, detail="Failed to create reservation")
-    return response.data[0]
+    interval_index.upsert(row)
+    await interval_index.record_write(storage)
+    await sync_outbox(storage, row)
+    return row
+
+def raise_overlap():
+    # 다른 인스턴스에서 동시에 예약된 경우 DB exclusion 제약조건 위반으로 실패 -> 인덱스 재적재
+    interval_index.invalidate()
+    raise HTTPException(status_code=400, detail="이미 예약된 날짜입니다.")
+
+async def sync_outbox(storage, reservation):
+    # 예약 변경 시 발송 예정 메시지(outbox) 재계산
+    try:
+        await outbox.sync_reservation(storage, reservation, await template_cache.get_templates(storage))
+    except Exception as e:
+        print(f"Outbox sync failed (reservation_id={reservation['id']}): {e}")
 
 from app.models import ReservationCreate, ReservationUpdate, Reservation
 
+@router.post("/import", response_model=dict)
+async def import_reservations(request: Request, dry_run: bool = False, storage: Storage = Depends(get_storage)):
+    """
+    예약 일괄 등록. 본문은 JSON 배열 또는 CSV (Content-Type: text/csv, 헤더: guest_name,phone_number,accommodation_name,checkin_date,checkout_date,memo)
+    dry_run=true 이면 검사 결과만 반환
+    """
+    try:
+        rows = reservation_import.parse_rows(await request.body(), request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid import body: {e}")
+
+    valid, results = reservation_import.validate_rows(rows)
+
+    # 기존 예약 1회 조회 + sweep-line 겹침 검사
+    existing = await reservation_import.fetch_existing(storage, valid)
+    accepted, rejected = reservation_import.sweep(valid, existing)
+    results.extend(rejected)
+
+    if dry_run:
+        results.extend({"row": idx, "status": "accepted"} for idx, _ in accepted)
+    else:
+        inserted, insert_results = await reservation_import.insert_accepted(storage, accepted)
+        results.extend(insert_results)
+
+        for row in inserted:
+            interval_index.upsert(row)
+        try:
+            await outbox.schedule_reservations(storage, inserted, await template_cache.get_templates(storage))
+        except Exception as e:
+            print(f"Outbox sync failed (import of {len(inserted)} reservations): {e}")
+
+    results.sort(key=lambda r: r['row'])
+    return {
+        "total": len(rows),
+        "accepted": sum(1 for r in results if r['status'] == 'accepted'),
+        "rejected": sum(1 for r in results if r['status'] == 'rejected'),
+        "dry_run": dry_run,
+        "results": results
+    }
+
 @router.delete("/{reservation_id}")
-async def delete_reservation(reservation_id: int, supabase: Client = Depends(get_supabase)):
-    response = supabase.table("reservations").delete().eq("id", reservation_id).execute()
+async def delete_reservation(reservation_id: int, storage: Storage = Depends(get_storage)):
+    try:
+        await outbox.clear_reservation(storage, reservation_id)
+    except Exception as e:
+        print(f"Outbox clear failed (reservation_id={reservation_id}): {e}")
+    await storage.delete_reservation(reservation_id)
+    interval_index.remove(reservation_id)
+    await interval_index.record_write(storage)
     return {"message": "Reservation deleted"}
 
 @router.put("/{reservation_id}", response_model=dict)
-async def update_reservation(reservation_id: int, reservation: ReservationUpdate, supabase: Client = Depends(get_supabase)):
+async def update_reservation(reservation_id: int, reservation: ReservationUpdate, storage: Storage = Depends(get_storage)):
     data = jsonable_encoder(reservation)
     
     # Validation: Check for Overlapping Reservations (excluding current one)
-    existing = supabase.table("reservations").select("*") \
-        .eq("accommodation_name", reservation.accommodation_name) \
-        .neq("id", reservation_id) \
-        .lt("checkin_date", reservation.checkout_date) \
-        .gt("checkout_date", reservation.checkin_date) \
-        .execute()
-
-    if existing.data:
+    if await interval_index.overlaps(storage, reservation.accommodation_name, reservation.checkin_date, reservation.checkout_date,
+                                     exclude_id=reservation_id):
          raise HTTPException(status_code=400, detail="이미 예약된 날짜입니다.")
 
-    response = supabase.table("reservations").update(data).eq("id", reservation_id).execute()
-    if not response.data:
+    try:
+        row = await storage.update_reservation(reservation_id, data)
+    except OverlapError:
+        raise_overlap()
+    if not row:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    return response.data[0]
+    interval_index.upsert(row)
+    await interval_index.record_write(storage)
+    await sync_outbox(storage, row)
+    return row
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.database import get_supabase
-from app.utils.sms import send_sms
-from datetime import datetime
-import pytz
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Request
+from app.database import get_storage
+from app.storage import Storage
+from app.utils.sms import send_sms_batch_async, is_failed
+from app.utils.sms_logs import insert_logs, fetch_log_page, LOG_PAGE_MAX
+from app.utils.csv_export import csv_response
+from app.utils import template_cache
+from app.utils.renderer import render_batch, TemplateError
+from app.utils.etag import make_etag, not_modified, etag_response
+from app.utils.metrics import SMS_MESSAGES
+from app.config import KST
+from datetime import datetime, date
+import asyncio
 from pydantic import BaseModel
 from typing import Optional
 
 router = APIRouter(prefix="/api/sms", tags=["sms"])
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
 
-KST = pytz.timezone('Asia/Seoul')
-
 class ManualSendRequest(BaseModel):
     reservation_id: int
     template_type: str # 'checkin', 'checkout', 'custom', 'common'
@@ -20,52 +25,56 @@ class ManualSendRequest(BaseModel):
     subject: Optional[str] = None
 
 @router.post("/send-manual")
-async def send_manual_sms(req: ManualSendRequest, supabase: Client = Depends(get_supabase)):
-    # 1. 예약 정보 가져오기
-    res_data = supabase.table("reservations").select("*").eq("id", req.reservation_id).single().execute()
-    if not res_data.data:
+async def send_manual_sms(req: ManualSendRequest, storage: Storage = Depends(get_storage)):
+    # 1. 예약 정보 + 템플릿 목록 동시 조회 (서로 독립적인 쿼리)
+    reservation, all_templates = await asyncio.gather(
+        storage.get_reservation(req.reservation_id),
+        template_cache.get_templates(storage)
+    )
+    if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
     
-    reservation = res_data.data
-    
     # 2. 메시지 내용 및 제목 결정
     content = ""
     subject = req.subject  # 요청에 포함된 제목 우선 사용
+    source_template = None  # 내용을 가져온 템플릿 (렌더러 캐시 키로 사용)
     
     if req.custom_content:
         content = req.custom_content
     elif req.template_type == 'common':
-         # Fetch 'common' template from DB
-         tmpl_res = supabase.table("message_templates").select("*").eq("trigger_type", "common").execute()
-         if tmpl_res.data:
-             content = tmpl_res.data[0]['content']
-             if not subject and tmpl_res.data[0].get('subject'): # 제목이 없으면 템플릿 제목 사용
-                 subject = tmpl_res.data[0]['subject']
+         # Fetch 'common' template (cached)
+         common_templates = [t for t in all_templates if t['trigger_type'] == 'common']
+         if common_templates:
+             source_template = common_templates[0]
+             content = common_templates[0]['content']
+             if not subject and common_templates[0].get('subject'): # 제목이 없으면 템플릿 제목 사용
+                 subject = common_templates[0]['subject']
          else:
              content = "[공지사항] {name}님, 초원SMS에서 알려드립니다.\n\n(관리자 페이지에서 공통 템플릿 내용을 설정해주세요.)" 
     else:
         if req.template_id:
-            tmpl_res = supabase.table("message_templates").select("*").eq("id", req.template_id).single().execute()
-            if tmpl_res.data:
-                content = tmpl_res.data['content']
-                if not subject and tmpl_res.data.get('subject'):
-                    subject = tmpl_res.data['subject']
+            template = next((t for t in all_templates if t['id'] == req.template_id), None)
+            if template:
+                source_template = template
+                content = template['content']
+                if not subject and template.get('subject'):
+                    subject = template['subject']
             else:
                 raise HTTPException(status_code=404, detail="Template not found")
         else:
             # Fallback: Search by trigger_type and (accommodation_name OR '공통메세지')
-            # Supabase conditional query is complex, simpler to fetch by trigger_type and filter in code or use `in_` for accommodation
-            tmpl_res = supabase.table("message_templates").select("*")\
-                .eq("trigger_type", req.template_type)\
-                .in_("accommodation_name", [reservation['accommodation_name'], "공통메세지"])\
-                .execute()
+            # 캐시된 전체 템플릿에서 코드 레벨로 필터링
+            found_templates = [
+                t for t in all_templates
+                if t['trigger_type'] == req.template_type
+                and t['accommodation_name'] in (reservation['accommodation_name'], "공통메세지")
+            ]
             
-            if tmpl_res.data:
+            if found_templates:
                  # If multiple found, prefer specific implementation if it existed (but here we assume distinct or specific overrides)
                  # We'll just take the first one, or prioritize specific if needed.
                  # Let's sort to prioritize specific: if name == res['acc_name'] comes first?
                  # Actually, usually specific is better.
-                 found_templates = tmpl_res.data
                  target_template = None
                  
                  # Try to find exact match first
@@ -82,6 +91,7 @@ async def send_manual_sms(req: ManualSendRequest, supabase: Client = Depends(get
                              break
                  
                  if target_template:
+                     source_template = target_template
                      content = target_template['content']
                      if not subject and target_template.get('subject'):
                          subject = target_template['subject']
@@ -93,29 +103,28 @@ async def send_manual_sms(req: ManualSendRequest, supabase: Client = Depends(get
     if not content:
         raise HTTPException(status_code=400, detail="Content could not be determined")
 
-    # 3. 변수 치환
-    formatted_content = content.format(
-        name=reservation['guest_name'],
-        accommodation=reservation['accommodation_name']
-    )
-    
-    formatted_subject = None
-    if subject:
-        try:
-            formatted_subject = subject.format(
-                name=reservation['guest_name'],
-                accommodation=reservation['accommodation_name']
-            )
-        except Exception:
-            formatted_subject = subject # 포맷팅 실패 시 원본 사용
+    # 3. 변수 치환 (컴파일된 렌더러 사용, 템플릿 내용 그대로인 경우 id 로 캐시)
+    template_id = None
+    if source_template and not req.custom_content and not req.subject:
+        template_id = source_template['id']
+    try:
+        formatted_content, formatted_subject = render_batch(
+            {"id": template_id, "content": content, "subject": subject},
+            [reservation]
+        )[0]
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=f"템플릿 형식 오류: {e}")
 
     # 4. 발송
-    send_result = send_sms(reservation['phone_number'], formatted_content, subject=formatted_subject)
+    send_result = (await send_sms_batch_async([{
+        "to": reservation['phone_number'],
+        "text": formatted_content,
+        "subject": formatted_subject
+    }]))[0]
     
     # 5. 로그 기록
-    status = 'success'
-    if isinstance(send_result, dict) and ('error' in send_result or send_result.get('status') == 'error'):
-        status = 'failed'
+    status = 'failed' if is_failed(send_result) else 'success'
+    SMS_MESSAGES.inc(trigger_type="manual_" + req.template_type, result='sent' if status == 'success' else 'failed')
 
     now_kst = datetime.now(KST)
     log_data = {
@@ -127,10 +136,10 @@ async def send_manual_sms(req: ManualSendRequest, supabase: Client = Depends(get
         # "content": formatted_content # 로그 테이블에 content 컬럼이 있다면 추가
     }
     
-    try:
-        supabase.table("sms_logs").insert(log_data).execute()
-    except Exception as e:
-        print(f"Log insert failed: {e}")
+    # cron 과 같은 경로로 기록 (같은 날 같은 트리거 로그가 있으면 on_conflict 로 무시)
+    log_status = (await insert_logs(storage, [log_data]))[0]
+    if log_status == 'failed':
+        print(f"Log insert failed: reservation_id={reservation['id']}")
 
     if status == 'failed':
          raise HTTPException(status_code=500, detail=f"SMS Sending Failed: {send_result.get('error')}")
@@ -138,33 +147,67 @@ async def send_manual_sms(req: ManualSendRequest, supabase: Client = Depends(get
     return {"status": "success", "result": send_result}
 
 @router.get("/logs")
-async def get_sms_logs(supabase: Client = Depends(get_supabase)):
-    # 로그와 예약 정보를 조인해서 가져와야 함.
-    # Supabase JS client는 조인이 쉽지만, Python client는 raw query나 rpc를 쓰거나, 두 번 쿼리해야 함.
-    # 여기서는 간단히 두 번 쿼리해서 병합 (데이터 양이 적을 때 유효)
-    
-    logs_res = supabase.table("sms_logs").select("*").order("sent_at", desc=True).limit(50).execute()
-    logs = logs_res.data
-    
-    if not logs:
-        return []
+async def get_sms_logs(
+    request: Request,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+    trigger_type: Optional[str] = None,
+    accommodation: Optional[str] = None,
+    storage: Storage = Depends(get_storage)
+):
+    # 다음 페이지(cursor) 요청은 매번 다른 범위라 재검증 이득이 없으므로 ETag 없이 바로 조회
+    etag = None
+    if cursor is None:
+        # 로그 추가/재발송 결과 반영 모두 sms_logs 변경 횟수가 바뀌므로 이것으로 변경 여부 판단
+        # (예약 정보가 바뀐 경우도 반영되도록 예약 테이블 표시값 포함)
+        versions = await asyncio.gather(
+            storage.table_version("sms_logs"),
+            storage.table_version("reservations")
+        )
+        etag = make_etag(request, *versions)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
 
-    # 관련된 reservation_id 추출
-    res_ids = [log['reservation_id'] for log in logs]
-    
-    # 예약 정보 조회
-    reservations_res = supabase.table("reservations").select("id, guest_name, accommodation_name, phone_number").in_("id", res_ids).execute()
-    reservations = {r['id']: r for r in reservations_res.data}
-    
-    # 병합
-    result = []
-    for log in logs:
-        res_info = reservations.get(log['reservation_id'], {})
-        result.append({
-            **log,
-            "guest_name": res_info.get("guest_name", "Unknown"),
-            "accommodation_name": res_info.get("accommodation_name", "-"),
-            "phone_number": res_info.get("phone_number", "-")
-        })
-        
-    return result
+    # 예약 정보는 embedded select 로 같은 요청에서 조인, (sent_at, id) keyset 페이지네이션
+    try:
+        logs, next_cursor = await fetch_log_page(
+            storage, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to,
+            status=status, trigger_type=trigger_type, accommodation=accommodation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if etag is None:
+        return {"items": logs, "next_cursor": next_cursor}
+    return etag_response({"items": logs, "next_cursor": next_cursor}, etag)
+
+LOG_EXPORT_COLUMNS = ["id", "sent_at", "sent_date", "reservation_id", "guest_name", "phone_number",
+                      "accommodation_name", "trigger_type", "status"]
+
+@router.get("/logs/export.csv")
+async def export_sms_logs(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+    trigger_type: Optional[str] = None,
+    accommodation: Optional[str] = None,
+    storage: Storage = Depends(get_storage)
+):
+    # /logs 와 같은 필터, keyset 페이지를 차례로 조회하면서 CSV 로 스트리밍
+    async def pages():
+        cursor = None
+        while True:
+            logs, cursor = await fetch_log_page(
+                storage, limit=LOG_PAGE_MAX, cursor=cursor, date_from=date_from, date_to=date_to,
+                status=status, trigger_type=trigger_type, accommodation=accommodation
+            )
+            yield logs
+            if not cursor:
+                break
+
+    filename = f"sms_logs_{datetime.now(KST).strftime('%Y%m%d_%H%M')}.csv"
+    return csv_response(LOG_EXPORT_COLUMNS, pages(), filename)
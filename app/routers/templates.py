@@ -1,36 +1,57 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.database import get_supabase
+from fastapi import APIRouter, HTTPException, Depends, Request
+from app.database import get_storage
+from app.storage import Storage
 from app.models import MessageTemplateCreate
-from supabase import Client
+from app.utils import template_cache, outbox
+from app.utils.renderer import validate_template, TemplateError
+from app.utils.etag import make_etag, not_modified, etag_response
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
 @router.get("/", response_model=list[dict])
-async def get_templates(supabase: Client = Depends(get_supabase)):
-    response = supabase.table("message_templates").select("*").order("accommodation_name, trigger_type").execute()
-    return response.data
+async def get_templates(request: Request, storage: Storage = Depends(get_storage)):
+    etag = make_etag(request, await storage.table_version("message_templates"))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    return etag_response(await storage.list_templates(), etag)
 
 from app.models import MessageTemplateUpdate
 
 @router.put("/{template_id}", response_model=dict)
-async def update_template(template_id: int, template: MessageTemplateUpdate, supabase: Client = Depends(get_supabase)):
+async def update_template(template_id: int, template: MessageTemplateUpdate, storage: Storage = Depends(get_storage)):
     # 1. 대상 템플릿 정보 조회
-    target = supabase.table("message_templates").select("*").eq("id", template_id).execute()
-    if not target.data:
+    target_data = await storage.get_template(template_id)
+    if not target_data:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    target_data = target.data[0]
+    # 저장 전 치환 변수/중괄호 형식 검증 (잘못된 템플릿이 발송 중에 실패하지 않도록)
+    try:
+        validate_template(template.content, template.subject)
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     acc_name = target_data['accommodation_name']
     trigger_type = target_data['trigger_type']
     
     update_payload = {
         "subject": template.subject,
         "content": template.content,
-        "send_time": str(template.send_time)
+        "send_time": str(template.send_time),
+        "updated_at": datetime.now(timezone.utc).isoformat()
     }
 
     # 단일 업데이트 (apply_all 로직 제거됨)
-    response = supabase.table("message_templates").update(update_payload).eq("id", template_id).execute()
+    updated = await storage.update_template(template_id, update_payload)
+    template_cache.invalidate()
 
+    # 발송 시각/내용이 바뀌었으므로 해당 템플릿의 미발송 outbox 재계산
+    if updated:
+        try:
+            await outbox.sync_template(storage, updated)
+        except Exception as e:
+            print(f"Outbox sync failed (template_id={template_id}): {e}")
 
-    return response.data[0]
+    return updated
@@ -0,0 +1,192 @@
+# 저장소(Storage) 인터페이스
+# - 라우터/cron/유틸은 쿼리 빌더 대신 이 메서드들만 사용
+# - 구현: SupabaseStorage (운영), SQLiteStorage (로컬/벤치마크, schema.sql 과 같은 테이블 구조)
+# 반환 행은 모두 dict (날짜는 'YYYY-MM-DD', 시각은 ISO 문자열), 시각 인자는 tz-aware datetime
+# 예약을 포함하는 행(fetch_due, log_page)은 예약 정보를 "reservations" 키 아래 dict 로 담음
+
+class OverlapError(Exception):
+    """
+    같은 숙소의 예약 기간이 겹쳐 저장할 수 없음 (DB exclusion 제약조건 위반)
+    """
+
+class Storage:
+    async def close(self):
+        pass
+
+    # 변경 표시값
+    async def table_version(self, table: str) -> int:
+        """
+        테이블 변경 표시값: table_changes 의 변경 횟수 (추가/수정/삭제 시 트리거가 증가, 줄어들지 않음)
+        """
+        raise NotImplementedError
+
+    # 예약
+    async def list_reservations(self, start=None, end=None, accommodations=None):
+        """
+        [start, end) 구간과 겹치는 예약 (checkin < end AND checkout > start), 입실일 순
+        """
+        raise NotImplementedError
+
+    async def reservation_page(self, after_id=0, limit=1000, start=None, end=None, accommodations=None):
+        """
+        list_reservations 와 같은 필터, id > after_id 인 예약을 id 순으로 limit 건
+        """
+        raise NotImplementedError
+
+    async def get_reservation(self, reservation_id):
+        raise NotImplementedError
+
+    async def insert_reservation(self, data):
+        """
+        저장된 예약 행 반환 (실패 시 None). 기간이 겹치면 OverlapError
+        """
+        raise NotImplementedError
+
+    async def insert_reservations(self, rows):
+        """
+        여러 예약을 한 번에 저장 (전부 성공 또는 전부 실패). 저장된 행을 요청 순서대로 반환
+        """
+        raise NotImplementedError
+
+    async def update_reservation(self, reservation_id, data):
+        """
+        수정된 예약 행 반환 (없으면 None). 기간이 겹치면 OverlapError
+        """
+        raise NotImplementedError
+
+    async def delete_reservation(self, reservation_id):
+        raise NotImplementedError
+
+    async def reservation_spans(self, accommodations=None, start=None, end=None):
+        """
+        겹침 검사용 (id, accommodation_name, checkin_date, checkout_date), 조건에 맞는 전체 행 (응답 크기 제한 없이)
+        필터를 주면 해당 숙소 중 [start, end) 와 겹치는 예약만
+        """
+        raise NotImplementedError
+
+    async def reservations_for_day(self, day, checkin=False, checkout=False, multinight=False, accommodations=None):
+        """
+        day 에 입실(checkin) / 퇴실(checkout) / 연박 중(multinight)인 예약 중 요청한 카테고리에 해당하는 예약
+        accommodations 를 주면 해당 숙소만
+        """
+        raise NotImplementedError
+
+    async def active_reservations(self, since, accommodation=None):
+        """
+        퇴실일이 since 이후(포함)인 예약
+        """
+        raise NotImplementedError
+
+    # 메시지 템플릿
+    async def list_templates(self):
+        """
+        전체 템플릿 (accommodation_name, trigger_type 순)
+        """
+        raise NotImplementedError
+
+    async def get_template(self, template_id):
+        raise NotImplementedError
+
+    async def insert_templates(self, rows):
+        """
+        저장된 템플릿 행을 요청 순서대로 반환
+        """
+        raise NotImplementedError
+
+    async def update_template(self, template_id, data):
+        """
+        수정된 템플릿 행 반환 (없으면 None)
+        """
+        raise NotImplementedError
+
+    # 발송 로그
+    async def insert_logs(self, rows):
+        """
+        로그 행 저장. 같은 (reservation_id, trigger_type, sent_date) 가 이미 있으면 무시
+        반환값: 새로 저장된 행 리스트
+        """
+        raise NotImplementedError
+
+    async def logged_keys(self, sent_date, trigger_types):
+        """
+        sent_date 에 기록된 로그 중 trigger_type 이 trigger_types 에 속하는 (reservation_id, trigger_type) 집합
+        """
+        raise NotImplementedError
+
+    async def log_page(self, limit, after=None, date_from=None, date_to=None,
+                       status=None, trigger_prefix=None, accommodation=None):
+        """
+        (sent_at DESC, id DESC) 순 로그 limit 건 (예약 정보 포함)
+        - after: (sent_at, id) 이면 그보다 뒤의 행부터
+        - accommodation 을 주면 해당 숙소 예약의 로그만
+        """
+        raise NotImplementedError
+
+    # 발송 예정 메시지 (outbox)
+    async def insert_scheduled(self, rows):
+        """
+        같은 (reservation_id, trigger_type, send_at) 가 이미 있으면 무시
+        """
+        raise NotImplementedError
+
+    async def clear_scheduled(self, reservation_id=None, template_id=None):
+        """
+        미발송 행 삭제 (조건이 없으면 전체 미발송 행)
+        """
+        raise NotImplementedError
+
+    async def fetch_due(self, window_start, window_end):
+        """
+        window_start <= send_at <= window_end 이고 미발송인 행 (예약 정보 포함), send_at 순
+        """
+        raise NotImplementedError
+
+    async def claim_scheduled(self, ids, now, lease_until):
+        """
+        ids 중 미발송이고 선점되지 않은(또는 선점이 만료된) 행을 lease_until 까지 선점하고 선점한 id 목록 반환
+        """
+        raise NotImplementedError
+
+    async def mark_scheduled_sent(self, ids, sent_at):
+        raise NotImplementedError
+
+    # cron 상태
+    async def get_watermark(self, name):
+        """
+        ISO 문자열 또는 None
+        """
+        raise NotImplementedError
+
+    async def set_watermark(self, name, watermark):
+        raise NotImplementedError
+
+    # 발송 재시도 큐
+    async def enqueue_retries(self, rows):
+        """
+        재시도할 메시지 저장. 같은 (reservation_id, trigger_type, sent_date) 가 이미 있으면 무시
+        """
+        raise NotImplementedError
+
+    async def claim_retries(self, now, lease_until, limit):
+        """
+        next_attempt_at <= now 인 행을 (next_attempt_at 순) 최대 limit 건 가져오면서
+        next_attempt_at 을 lease_until 로 미룸 (동시에 실행된 다른 재시도 처리와 겹치지 않도록)
+        반환값: 가져온 행 리스트
+        """
+        raise NotImplementedError
+
+    async def update_retries(self, rows):
+        """
+        행별 attempts / next_attempt_at(datetime) / last_error 저장 (rows 는 claim_retries 가 반환한 행)
+        """
+        raise NotImplementedError
+
+    async def delete_retries(self, ids):
+        raise NotImplementedError
+
+    async def update_log_results(self, rows):
+        """
+        (reservation_id, trigger_type, sent_date) 로그의 status / retried_at / attempts 갱신 (sent_at 은 그대로, updated_at 갱신)
+        retried_at 이 없으면(만료 처리) 기존 값 유지
+        """
+        raise NotImplementedError
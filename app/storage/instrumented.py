@@ -0,0 +1,25 @@
+import inspect
+
+from app.utils import metrics
+
+# 저장소 호출 시간 측정 래퍼
+# - 모든 async 메서드 호출을 storage_query_duration_seconds{backend, operation, outcome} 에 기록
+# - 그 밖의 속성은 원래 저장소 것을 그대로 반환
+
+class InstrumentedStorage:
+    def __init__(self, inner, backend: str):
+        self.inner = inner
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def timed(*args, **kwargs):
+            with metrics.STORAGE_QUERY_DURATION.time(backend=self.backend, operation=name, outcome="error") as labels:
+                result = await attr(*args, **kwargs)
+                labels["outcome"] = "ok"
+                return result
+
+        return timed
@@ -0,0 +1,512 @@
+import sqlite3
+from datetime import datetime, timezone
+
+from app.storage.base import Storage, OverlapError
+
+# SQLite 저장소 - 로컬 실행 / 오프라인 벤치마크용 (Supabase 없이 동작)
+# - schema.sql 과 같은 테이블 구조 (숙소 목록 테이블, updated_at 트리거 제외)
+# - Postgres 의 exclusion 제약조건 대신 저장 시 같은 숙소 기간 겹침을 직접 검사
+# - 시각은 UTC ISO 문자열(마이크로초 고정)로 저장해서 문자열 비교 = 시각 비교가 되도록 함
+# - sqlite3 는 동기 API 지만 로컬 파일/메모리 DB 조회는 짧으므로 이벤트 루프에서 바로 실행
+# path=":memory:" 이면 프로세스 메모리에만 유지
+
+SCHEMA = """
+create table if not exists message_templates (
+  id integer primary key autoincrement,
+  accommodation_name text not null,
+  trigger_type text not null,
+  send_time text not null,
+  subject text,
+  content text not null,
+  created_at text not null,
+  updated_at text not null,
+  unique (accommodation_name, trigger_type)
+);
+
+create table if not exists reservations (
+  id integer primary key autoincrement,
+  guest_name text not null,
+  phone_number text not null,
+  accommodation_name text not null,
+  checkin_date text not null,
+  checkout_date text not null,
+  memo text,
+  created_at text not null,
+  updated_at text not null
+);
+create index if not exists reservations_checkin_date_idx on reservations (checkin_date);
+create index if not exists reservations_checkout_date_idx on reservations (checkout_date);
+create index if not exists reservations_accommodation_idx on reservations (accommodation_name, checkin_date);
+
+create table if not exists sms_logs (
+  id integer primary key autoincrement,
+  reservation_id integer not null references reservations(id) on delete cascade,
+  trigger_type text not null,
+  sent_at text not null,
+  sent_date text not null,
+  status text default 'success',
+  attempts integer not null default 1,
+  retried_at text,
+  updated_at text not null,
+  unique (reservation_id, trigger_type, sent_date)
+);
+create index if not exists sms_logs_sent_at_id_idx on sms_logs (sent_at desc, id desc);
+create index if not exists sms_logs_sent_date_trigger_idx on sms_logs (sent_date, trigger_type);
+
+create table if not exists scheduled_messages (
+  id integer primary key autoincrement,
+  reservation_id integer not null references reservations(id) on delete cascade,
+  template_id integer not null references message_templates(id) on delete cascade,
+  trigger_type text not null,
+  send_at text not null,
+  sent_at text,
+  claimed_until text,
+  created_at text not null,
+  unique (reservation_id, trigger_type, send_at)
+);
+create index if not exists scheduled_messages_due_idx on scheduled_messages (send_at) where sent_at is null;
+create index if not exists scheduled_messages_template_idx on scheduled_messages (template_id) where sent_at is null;
+
+create table if not exists cron_state (
+  name text primary key,
+  watermark text
+);
+
+create table if not exists sms_retry_queue (
+  id integer primary key autoincrement,
+  reservation_id integer not null references reservations(id) on delete cascade,
+  trigger_type text not null,
+  sent_date text not null,
+  phone_number text not null,
+  content text not null,
+  subject text,
+  attempts integer not null default 1,
+  next_attempt_at text not null,
+  last_error text,
+  created_at text not null,
+  unique (reservation_id, trigger_type, sent_date)
+);
+create index if not exists sms_retry_queue_next_attempt_idx on sms_retry_queue (next_attempt_at);
+
+create table if not exists table_changes (
+  name text primary key,
+  changes integer not null default 0
+);
+create trigger if not exists message_templates_count_insert_changes after insert on message_templates
+begin
+  insert into table_changes (name, changes) values ('message_templates', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists message_templates_count_update_changes after update on message_templates
+begin
+  insert into table_changes (name, changes) values ('message_templates', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists message_templates_count_delete_changes after delete on message_templates
+begin
+  insert into table_changes (name, changes) values ('message_templates', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists reservations_count_insert_changes after insert on reservations
+begin
+  insert into table_changes (name, changes) values ('reservations', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists reservations_count_update_changes after update on reservations
+begin
+  insert into table_changes (name, changes) values ('reservations', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists reservations_count_delete_changes after delete on reservations
+begin
+  insert into table_changes (name, changes) values ('reservations', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists sms_logs_count_insert_changes after insert on sms_logs
+begin
+  insert into table_changes (name, changes) values ('sms_logs', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists sms_logs_count_update_changes after update on sms_logs
+begin
+  insert into table_changes (name, changes) values ('sms_logs', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+create trigger if not exists sms_logs_count_delete_changes after delete on sms_logs
+begin
+  insert into table_changes (name, changes) values ('sms_logs', 1)
+  on conflict (name) do update set changes = changes + 1;
+end;
+"""
+
+RESERVATION_COLUMNS = ["id", "guest_name", "phone_number", "accommodation_name", "checkin_date", "checkout_date"]
+LOG_RESERVATION_COLUMNS = ["guest_name", "accommodation_name", "phone_number"]
+
+def _ts(value):
+    """
+    datetime / ISO 문자열 -> UTC ISO 문자열 (시간대가 없으면 UTC 로 간주)
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+def _now():
+    return _ts(datetime.now(timezone.utc))
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+class SQLiteStorage(Storage):
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("pragma foreign_keys = on")
+        self.conn.executescript(SCHEMA)
+
+    async def close(self):
+        self.conn.close()
+
+    def _all(self, sql, params=()):
+        return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def _one(self, sql, params=()):
+        row = self.conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    def _insert(self, table, row):
+        columns = list(row)
+        cur = self.conn.execute(
+            f"insert into {table} ({', '.join(columns)}) values ({_placeholders(columns)})",
+            [row[c] for c in columns]
+        )
+        return cur.lastrowid
+
+    async def table_version(self, table):
+        row = self.conn.execute("select changes from table_changes where name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    # 예약
+    def _period_filter(self, start, end, accommodations):
+        where, params = [], []
+        if start:
+            where.append("checkout_date > ?")
+            params.append(str(start))
+        if end:
+            where.append("checkin_date < ?")
+            params.append(str(end))
+        if accommodations is not None:
+            accommodations = list(accommodations)
+            where.append(f"accommodation_name in ({_placeholders(accommodations)})")
+            params.extend(accommodations)
+        return where, params
+
+    def _check_overlap(self, row, exclude_id=None):
+        found = self.conn.execute(
+            "select id from reservations where accommodation_name = ? and checkin_date < ? and checkout_date > ? "
+            "and id != ? limit 1",
+            (row['accommodation_name'], str(row['checkout_date']), str(row['checkin_date']), exclude_id or 0)
+        ).fetchone()
+        if found:
+            raise OverlapError(f"overlaps reservation {found[0]}")
+
+    async def list_reservations(self, start=None, end=None, accommodations=None):
+        where, params = self._period_filter(start, end, accommodations)
+        clause = f"where {' and '.join(where)}" if where else ""
+        return self._all(f"select * from reservations {clause} order by checkin_date", params)
+
+    async def reservation_page(self, after_id=0, limit=1000, start=None, end=None, accommodations=None):
+        where, params = self._period_filter(start, end, accommodations)
+        where.insert(0, "id > ?")
+        params.insert(0, after_id)
+        return self._all(f"select * from reservations where {' and '.join(where)} order by id limit ?", params + [limit])
+
+    async def get_reservation(self, reservation_id):
+        return self._one("select * from reservations where id = ?", (reservation_id,))
+
+    async def insert_reservation(self, data):
+        return (await self.insert_reservations([data]))[0]
+
+    async def insert_reservations(self, rows):
+        now = _now()
+        ids = []
+        with self.conn:
+            for data in rows:
+                self._check_overlap(data)
+                ids.append(self._insert("reservations", {"created_at": now, "updated_at": now, **data}))
+        return [await self.get_reservation(i) for i in ids]
+
+    async def update_reservation(self, reservation_id, data):
+        current = await self.get_reservation(reservation_id)
+        if current is None:
+            return None
+        data = {**data, "updated_at": _now()}
+        with self.conn:
+            self._check_overlap({**current, **data}, exclude_id=reservation_id)
+            self.conn.execute(
+                f"update reservations set {', '.join(f'{c} = ?' for c in data)} where id = ?",
+                [*data.values(), reservation_id]
+            )
+        return await self.get_reservation(reservation_id)
+
+    async def delete_reservation(self, reservation_id):
+        with self.conn:
+            self.conn.execute("delete from reservations where id = ?", (reservation_id,))
+
+    async def reservation_spans(self, accommodations=None, start=None, end=None):
+        where, params = self._period_filter(start, end, accommodations)
+        clause = f"where {' and '.join(where)}" if where else ""
+        return self._all(f"select id, accommodation_name, checkin_date, checkout_date from reservations {clause}", params)
+
+    async def reservations_for_day(self, day, checkin=False, checkout=False, multinight=False, accommodations=None):
+        today = str(day)
+        conditions, params = [], []
+        if checkin:
+            conditions.append("checkin_date = ?")
+            params.append(today)
+        if checkout:
+            conditions.append("checkout_date = ?")
+            params.append(today)
+        if multinight:
+            conditions.append("(checkin_date < ? and checkout_date > ?)")
+            params.extend([today, today])
+        if not conditions:
+            return []
+
+        sql = f"select {', '.join(RESERVATION_COLUMNS)} from reservations " \
+              f"where checkin_date <= ? and checkout_date >= ? and ({' or '.join(conditions)})"
+        params = [today, today] + params
+        if accommodations is not None:
+            accommodations = sorted(accommodations)
+            sql += f" and accommodation_name in ({_placeholders(accommodations)})"
+            params.extend(accommodations)
+        return self._all(sql, params)
+
+    async def active_reservations(self, since, accommodation=None):
+        sql = f"select {', '.join(RESERVATION_COLUMNS)} from reservations where checkout_date >= ?"
+        params = [str(since)]
+        if accommodation is not None:
+            sql += " and accommodation_name = ?"
+            params.append(accommodation)
+        return self._all(sql, params)
+
+    # 메시지 템플릿
+    async def list_templates(self):
+        return self._all("select * from message_templates order by accommodation_name, trigger_type")
+
+    async def get_template(self, template_id):
+        return self._one("select * from message_templates where id = ?", (template_id,))
+
+    async def insert_templates(self, rows):
+        now = _now()
+        with self.conn:
+            ids = [self._insert("message_templates", {"created_at": now, "updated_at": now, **row}) for row in rows]
+        return [await self.get_template(i) for i in ids]
+
+    async def update_template(self, template_id, data):
+        data = {**data, "updated_at": _now()}
+        with self.conn:
+            cur = self.conn.execute(
+                f"update message_templates set {', '.join(f'{c} = ?' for c in data)} where id = ?",
+                [*data.values(), template_id]
+            )
+        return await self.get_template(template_id) if cur.rowcount else None
+
+    # 발송 로그
+    async def insert_logs(self, rows):
+        inserted_ids = []
+        now = _now()
+        with self.conn:
+            for row in rows:
+                row = {**row, "sent_at": _ts(row['sent_at']), "updated_at": now}
+                columns = list(row)
+                cur = self.conn.execute(
+                    f"insert into sms_logs ({', '.join(columns)}) values ({_placeholders(columns)}) "
+                    f"on conflict (reservation_id, trigger_type, sent_date) do nothing",
+                    [row[c] for c in columns]
+                )
+                if cur.rowcount:
+                    inserted_ids.append(cur.lastrowid)
+        if not inserted_ids:
+            return []
+        return self._all(f"select * from sms_logs where id in ({_placeholders(inserted_ids)}) order by id", inserted_ids)
+
+    async def logged_keys(self, sent_date, trigger_types):
+        trigger_types = list(trigger_types)
+        if not trigger_types:
+            return set()
+        rows = self.conn.execute(
+            f"select reservation_id, trigger_type from sms_logs "
+            f"where sent_date = ? and trigger_type in ({_placeholders(trigger_types)})",
+            [str(sent_date)] + trigger_types
+        ).fetchall()
+        return {(row[0], row[1]) for row in rows}
+
+    async def log_page(self, limit, after=None, date_from=None, date_to=None,
+                       status=None, trigger_prefix=None, accommodation=None):
+        join = "join" if accommodation else "left join"
+        where, params = [], []
+        if date_from:
+            where.append("l.sent_date >= ?")
+            params.append(str(date_from))
+        if date_to:
+            where.append("l.sent_date <= ?")
+            params.append(str(date_to))
+        if status:
+            where.append("l.status = ?")
+            params.append(status)
+        if trigger_prefix:
+            where.append("substr(l.trigger_type, 1, ?) = ?")
+            params.extend([len(trigger_prefix), trigger_prefix])
+        if accommodation:
+            where.append("r.accommodation_name = ?")
+            params.append(accommodation)
+        if after:
+            sent_at, log_id = after
+            where.append("(l.sent_at < ? or (l.sent_at = ? and l.id < ?))")
+            params.extend([sent_at, sent_at, log_id])
+
+        clause = f"where {' and '.join(where)}" if where else ""
+        rows = self._all(
+            f"select l.*, {', '.join(f'r.{c} as r_{c}' for c in LOG_RESERVATION_COLUMNS)}, r.id as r_id "
+            f"from sms_logs l {join} reservations r on r.id = l.reservation_id {clause} "
+            f"order by l.sent_at desc, l.id desc limit ?",
+            params + [limit]
+        )
+        return [self._nest(row, LOG_RESERVATION_COLUMNS) for row in rows]
+
+    def _nest(self, row, columns):
+        # 조인한 예약 컬럼(r_*)을 PostgREST embedded select 와 같은 "reservations" dict 로 묶음
+        has_reservation = row.pop("r_id", None) is not None
+        reservation = {c: row.pop(f"r_{c}") for c in columns if f"r_{c}" in row}
+        row["reservations"] = reservation if has_reservation else None
+        return row
+
+    # 발송 예정 메시지 (outbox)
+    async def insert_scheduled(self, rows):
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "insert into scheduled_messages (reservation_id, template_id, trigger_type, send_at, created_at) "
+                "values (?, ?, ?, ?, ?) on conflict (reservation_id, trigger_type, send_at) do nothing",
+                [(r['reservation_id'], r['template_id'], r['trigger_type'], _ts(r['send_at']), now) for r in rows]
+            )
+
+    async def clear_scheduled(self, reservation_id=None, template_id=None):
+        sql = "delete from scheduled_messages where sent_at is null"
+        params = []
+        if reservation_id is not None:
+            sql += " and reservation_id = ?"
+            params.append(reservation_id)
+        if template_id is not None:
+            sql += " and template_id = ?"
+            params.append(template_id)
+        with self.conn:
+            self.conn.execute(sql, params)
+
+    async def fetch_due(self, window_start, window_end):
+        columns = [c for c in RESERVATION_COLUMNS if c != "id"]
+        rows = self._all(
+            f"select s.id, s.template_id, s.trigger_type, s.send_at, r.id as r_id, "
+            f"{', '.join(f'r.{c} as r_{c}' for c in columns)} "
+            f"from scheduled_messages s left join reservations r on r.id = s.reservation_id "
+            f"where s.sent_at is null and s.send_at >= ? and s.send_at <= ? order by s.send_at, s.id",
+            (_ts(window_start), _ts(window_end))
+        )
+        result = []
+        for row in rows:
+            reservation_id = row["r_id"]
+            row = self._nest(row, columns)
+            if row["reservations"] is not None:
+                row["reservations"]["id"] = reservation_id
+            result.append(row)
+        return result
+
+    async def claim_scheduled(self, ids, now, lease_until):
+        ids = list(ids)
+        with self.conn:
+            claimed = [row['id'] for row in self._all(
+                f"select id from scheduled_messages where id in ({_placeholders(ids)}) and sent_at is null "
+                f"and (claimed_until is null or claimed_until <= ?)",
+                ids + [_ts(now)]
+            )]
+            if claimed:
+                self.conn.execute(
+                    f"update scheduled_messages set claimed_until = ? where id in ({_placeholders(claimed)})",
+                    [_ts(lease_until)] + claimed
+                )
+        return claimed
+
+    async def mark_scheduled_sent(self, ids, sent_at):
+        ids = list(ids)
+        with self.conn:
+            self.conn.execute(
+                f"update scheduled_messages set sent_at = ? where id in ({_placeholders(ids)})",
+                [_ts(sent_at)] + ids
+            )
+
+    # cron 상태
+    async def get_watermark(self, name):
+        row = self._one("select watermark from cron_state where name = ?", (name,))
+        return row['watermark'] if row else None
+
+    async def set_watermark(self, name, watermark):
+        with self.conn:
+            self.conn.execute(
+                "insert into cron_state (name, watermark) values (?, ?) "
+                "on conflict (name) do update set watermark = excluded.watermark",
+                (name, _ts(watermark))
+            )
+
+    # 발송 재시도 큐
+    async def enqueue_retries(self, rows):
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "insert into sms_retry_queue (reservation_id, trigger_type, sent_date, phone_number, content, subject, "
+                "attempts, next_attempt_at, last_error, created_at) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "on conflict (reservation_id, trigger_type, sent_date) do nothing",
+                [(r['reservation_id'], r['trigger_type'], str(r['sent_date']), r['phone_number'], r['content'],
+                  r.get('subject'), r.get('attempts', 1), _ts(r['next_attempt_at']), r.get('last_error'), now)
+                 for r in rows]
+            )
+
+    async def claim_retries(self, now, lease_until, limit):
+        with self.conn:
+            ids = [row['id'] for row in self._all(
+                "select id from sms_retry_queue where next_attempt_at <= ? order by next_attempt_at, id limit ?",
+                (_ts(now), limit)
+            )]
+            if not ids:
+                return []
+            self.conn.execute(
+                f"update sms_retry_queue set next_attempt_at = ? where id in ({_placeholders(ids)})",
+                [_ts(lease_until)] + ids
+            )
+        return self._all(
+            f"select * from sms_retry_queue where id in ({_placeholders(ids)}) order by id", ids
+        )
+
+    async def update_retries(self, rows):
+        with self.conn:
+            self.conn.executemany(
+                "update sms_retry_queue set attempts = ?, next_attempt_at = ?, last_error = ? where id = ?",
+                [(r['attempts'], _ts(r['next_attempt_at']), r.get('last_error'), r['id']) for r in rows]
+            )
+
+    async def delete_retries(self, ids):
+        ids = list(ids)
+        with self.conn:
+            self.conn.execute(f"delete from sms_retry_queue where id in ({_placeholders(ids)})", ids)
+
+    async def update_log_results(self, rows):
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "update sms_logs set status = ?, retried_at = coalesce(?, retried_at), attempts = ?, updated_at = ? "
+                "where reservation_id = ? and trigger_type = ? and sent_date = ?",
+                [(r['status'], _ts(r['retried_at']) if r.get('retried_at') else None, r['attempts'], now,
+                  r['reservation_id'], r['trigger_type'], str(r['sent_date']))
+                 for r in rows]
+            )
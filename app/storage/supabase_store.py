@@ -0,0 +1,317 @@
+from supabase import acreate_client, AsyncClient
+
+from app.storage.base import Storage, OverlapError
+
+# Supabase(PostgREST) 저장소 - 운영 환경
+# 겹침은 DB exclusion 제약조건(23P01) 위반으로 감지해 OverlapError 로 변환
+
+# 발송/렌더링에 필요한 예약 컬럼 (memo 등 불필요한 컬럼 제외)
+RESERVATION_COLUMNS = "id, guest_name, phone_number, accommodation_name, checkin_date, checkout_date"
+SPAN_COLUMNS = "id, accommodation_name, checkin_date, checkout_date"
+LOG_RESERVATION_COLUMNS = "guest_name, accommodation_name, phone_number"
+
+# PostgREST 최대 응답 행 수 (이보다 많을 수 있는 조회는 id keyset 으로 이어서 조회)
+PAGE_SIZE = 1000
+
+LOG_CONFLICT_COLUMNS = "reservation_id,trigger_type,sent_date"
+OUTBOX_CONFLICT_COLUMNS = "reservation_id,trigger_type,send_at"
+RETRY_CONFLICT_COLUMNS = "reservation_id,trigger_type,sent_date"
+
+def _raise_if_overlap(error):
+    if "23P01" in str(error):
+        raise OverlapError(str(error)) from error
+
+class SupabaseStorage(Storage):
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    @classmethod
+    async def create(cls, url, key):
+        return cls(await acreate_client(url, key))
+
+    async def close(self):
+        await self.client.postgrest.aclose()
+
+    async def table_version(self, table):
+        # 건수(count="exact") 는 전체 스캔이므로 사용하지 않음 - 트리거가 관리하는 변경 횟수 한 건만 조회
+        res = await self.client.table("table_changes").select("changes").eq("name", table).execute()
+        return res.data[0]['changes'] if res.data else 0
+
+    # 예약
+    def _filter_period(self, query, start, end, accommodations):
+        if start:
+            query = query.gt("checkout_date", str(start))
+        if end:
+            query = query.lt("checkin_date", str(end))
+        if accommodations is not None:
+            query = query.in_("accommodation_name", list(accommodations))
+        return query
+
+    async def list_reservations(self, start=None, end=None, accommodations=None):
+        query = self._filter_period(self.client.table("reservations").select("*"), start, end, accommodations)
+        return (await query.order("checkin_date", desc=False).execute()).data
+
+    async def reservation_page(self, after_id=0, limit=1000, start=None, end=None, accommodations=None):
+        query = self.client.table("reservations").select("*").gt("id", after_id)
+        query = self._filter_period(query, start, end, accommodations)
+        return (await query.order("id").limit(limit).execute()).data
+
+    async def get_reservation(self, reservation_id):
+        res = await self.client.table("reservations").select("*").eq("id", reservation_id).execute()
+        return res.data[0] if res.data else None
+
+    async def insert_reservation(self, data):
+        rows = await self.insert_reservations([data])
+        return rows[0] if rows else None
+
+    async def insert_reservations(self, rows):
+        try:
+            res = await self.client.table("reservations").insert(rows).execute()
+        except Exception as e:
+            _raise_if_overlap(e)
+            raise
+        return res.data or []
+
+    async def update_reservation(self, reservation_id, data):
+        try:
+            res = await self.client.table("reservations").update(data).eq("id", reservation_id).execute()
+        except Exception as e:
+            _raise_if_overlap(e)
+            raise
+        return res.data[0] if res.data else None
+
+    async def delete_reservation(self, reservation_id):
+        await self.client.table("reservations").delete().eq("id", reservation_id).execute()
+
+    async def reservation_spans(self, accommodations=None, start=None, end=None):
+        # 전체 조회(인덱스 적재)는 PAGE_SIZE 를 넘으므로 id keyset 으로 끝까지 이어서 조회
+        spans = []
+        after_id = 0
+        while True:
+            query = self.client.table("reservations").select(SPAN_COLUMNS).gt("id", after_id)
+            query = self._filter_period(query, start, end, accommodations)
+            rows = (await query.order("id").limit(PAGE_SIZE).execute()).data
+            spans.extend(rows)
+            if len(rows) < PAGE_SIZE:
+                return spans
+            after_id = rows[-1]['id']
+
+    async def reservations_for_day(self, day, checkin=False, checkout=False, multinight=False, accommodations=None):
+        today = str(day)
+        conditions = []
+        # (1) 입실일 당일
+        if checkin:
+            conditions.append(f"checkin_date.eq.{today}")
+        # (2) 퇴실일 당일
+        if checkout:
+            conditions.append(f"checkout_date.eq.{today}")
+        # (3) 연박 (입실일 < 오늘 < 퇴실일)
+        if multinight:
+            conditions.append(f"and(checkin_date.lt.{today},checkout_date.gt.{today})")
+        if not conditions:
+            return []
+
+        query = self.client.table("reservations").select(RESERVATION_COLUMNS)\
+            .lte("checkin_date", today)\
+            .gte("checkout_date", today)\
+            .or_(",".join(conditions))
+        if accommodations is not None:
+            query = query.in_("accommodation_name", sorted(accommodations))
+        return (await query.execute()).data
+
+    async def active_reservations(self, since, accommodation=None):
+        # PostgREST 응답 행 수 제한(PAGE_SIZE)을 넘을 수 있으므로 id 순으로 나눠서 조회
+        reservations = []
+        after_id = 0
+        while True:
+            query = self.client.table("reservations").select(RESERVATION_COLUMNS)\
+                .gte("checkout_date", str(since))\
+                .gt("id", after_id)
+            if accommodation is not None:
+                query = query.eq("accommodation_name", accommodation)
+            rows = (await query.order("id").limit(PAGE_SIZE).execute()).data
+            reservations.extend(rows)
+            if len(rows) < PAGE_SIZE:
+                return reservations
+            after_id = rows[-1]['id']
+
+    # 메시지 템플릿
+    async def list_templates(self):
+        res = await self.client.table("message_templates").select("*").order("accommodation_name, trigger_type").execute()
+        return res.data
+
+    async def get_template(self, template_id):
+        res = await self.client.table("message_templates").select("*").eq("id", template_id).execute()
+        return res.data[0] if res.data else None
+
+    async def insert_templates(self, rows):
+        res = await self.client.table("message_templates").insert(rows).execute()
+        return res.data or []
+
+    async def update_template(self, template_id, data):
+        res = await self.client.table("message_templates").update(data).eq("id", template_id).execute()
+        return res.data[0] if res.data else None
+
+    # 발송 로그
+    async def insert_logs(self, rows):
+        res = await self.client.table("sms_logs").upsert(
+            rows,
+            on_conflict=LOG_CONFLICT_COLUMNS,
+            ignore_duplicates=True
+        ).execute()
+        return res.data or []
+
+    async def logged_keys(self, sent_date, trigger_types):
+        trigger_types = list(trigger_types)
+        keys = set()
+        if not trigger_types:
+            return keys
+        after_id = 0
+        while True:
+            res = await self.client.table("sms_logs").select("id, reservation_id, trigger_type")\
+                .eq("sent_date", str(sent_date))\
+                .in_("trigger_type", trigger_types)\
+                .gt("id", after_id)\
+                .order("id")\
+                .limit(PAGE_SIZE)\
+                .execute()
+            keys.update((row['reservation_id'], row['trigger_type']) for row in res.data)
+            # 보통은 한 번의 요청으로 끝남 (그날 해당 트리거 로그가 PAGE_SIZE 건 미만)
+            if len(res.data) < PAGE_SIZE:
+                return keys
+            after_id = res.data[-1]['id']
+
+    async def log_page(self, limit, after=None, date_from=None, date_to=None,
+                       status=None, trigger_prefix=None, accommodation=None):
+        # 예약 정보는 embedded select 로 같은 요청에서 조인 (숙소 필터 시 inner join)
+        embed = "reservations!inner" if accommodation else "reservations"
+        query = self.client.table("sms_logs").select(f"*, {embed}({LOG_RESERVATION_COLUMNS})")
+
+        if date_from:
+            query = query.gte("sent_date", str(date_from))
+        if date_to:
+            query = query.lte("sent_date", str(date_to))
+        if status:
+            query = query.eq("status", status)
+        if trigger_prefix:
+            query = query.like("trigger_type", f"{trigger_prefix}%")
+        if accommodation:
+            query = query.eq("reservations.accommodation_name", accommodation)
+        if after:
+            sent_at, log_id = after
+            # (sent_at, id) < (cursor.sent_at, cursor.id)
+            query = query.or_(f'sent_at.lt."{sent_at}",and(sent_at.eq."{sent_at}",id.lt.{log_id})')
+
+        return (await query.order("sent_at", desc=True).order("id", desc=True).limit(limit).execute()).data
+
+    # 발송 예정 메시지 (outbox)
+    async def insert_scheduled(self, rows):
+        await self.client.table("scheduled_messages").upsert(
+            rows,
+            on_conflict=OUTBOX_CONFLICT_COLUMNS,
+            ignore_duplicates=True
+        ).execute()
+
+    async def clear_scheduled(self, reservation_id=None, template_id=None):
+        query = self.client.table("scheduled_messages").delete().is_("sent_at", "null")
+        if reservation_id is not None:
+            query = query.eq("reservation_id", reservation_id)
+        if template_id is not None:
+            query = query.eq("template_id", template_id)
+        await query.execute()
+
+    async def fetch_due(self, window_start, window_end):
+        # 밀린 구간이 길면 PAGE_SIZE 를 넘을 수 있음 -> (send_at, id) 순으로 나눠서 모두 조회
+        # (잘린 채로 워터마크가 window_end 까지 전진하면 나머지 행이 영영 발송되지 않음)
+        due = []
+        last = None
+        while True:
+            query = self.client.table("scheduled_messages")\
+                .select(f"id, template_id, trigger_type, send_at, reservations({RESERVATION_COLUMNS})")\
+                .is_("sent_at", "null")\
+                .gte("send_at", window_start.isoformat())\
+                .lte("send_at", window_end.isoformat())
+            if last is not None:
+                send_at = last['send_at']
+                query = query.or_(f'send_at.gt."{send_at}",and(send_at.eq."{send_at}",id.gt.{last["id"]})')
+            rows = (await query.order("send_at").order("id").limit(PAGE_SIZE).execute()).data
+            due.extend(rows)
+            if len(rows) < PAGE_SIZE:
+                return due
+            last = rows[-1]
+
+    async def claim_scheduled(self, ids, now, lease_until):
+        # 조건부 update 한 번으로 선점 - 다른 틱이 먼저 선점한 행은 조건에서 빠짐 (갱신된 행만 반환)
+        res = await self.client.table("scheduled_messages").update({"claimed_until": lease_until.isoformat()})\
+            .in_("id", list(ids))\
+            .is_("sent_at", "null")\
+            .or_(f'claimed_until.is.null,claimed_until.lte."{now.isoformat()}"')\
+            .execute()
+        return [row['id'] for row in res.data]
+
+    async def mark_scheduled_sent(self, ids, sent_at):
+        await self.client.table("scheduled_messages").update({"sent_at": sent_at.isoformat()})\
+            .in_("id", list(ids))\
+            .execute()
+
+    # cron 상태
+    async def get_watermark(self, name):
+        res = await self.client.table("cron_state").select("watermark").eq("name", name).execute()
+        return res.data[0].get('watermark') if res.data else None
+
+    async def set_watermark(self, name, watermark):
+        await self.client.table("cron_state").upsert(
+            {"name": name, "watermark": watermark.isoformat()},
+            on_conflict="name"
+        ).execute()
+
+    # 발송 재시도 큐
+    async def enqueue_retries(self, rows):
+        await self.client.table("sms_retry_queue").upsert(
+            [{**r, "sent_date": str(r['sent_date']), "next_attempt_at": r['next_attempt_at'].isoformat()} for r in rows],
+            on_conflict=RETRY_CONFLICT_COLUMNS,
+            ignore_duplicates=True
+        ).execute()
+
+    async def claim_retries(self, now, lease_until, limit):
+        res = await self.client.table("sms_retry_queue").select("id")\
+            .lte("next_attempt_at", now.isoformat())\
+            .order("next_attempt_at")\
+            .order("id")\
+            .limit(limit)\
+            .execute()
+        ids = [row['id'] for row in res.data]
+        if not ids:
+            return []
+        # 조회 이후 다른 처리가 먼저 가져간 행은 next_attempt_at 조건에서 빠짐 (갱신된 행만 반환)
+        res = await self.client.table("sms_retry_queue").update({"next_attempt_at": lease_until.isoformat()})\
+            .in_("id", ids)\
+            .lte("next_attempt_at", now.isoformat())\
+            .execute()
+        return sorted(res.data, key=lambda row: row['id'])
+
+    async def update_retries(self, rows):
+        # 전체 행 upsert 한 번으로 행마다 다른 값을 저장
+        await self.client.table("sms_retry_queue").upsert(
+            [{**r, "next_attempt_at": r['next_attempt_at'].isoformat()} for r in rows],
+            on_conflict="id"
+        ).execute()
+
+    async def delete_retries(self, ids):
+        await self.client.table("sms_retry_queue").delete().in_("id", list(ids)).execute()
+
+    async def update_log_results(self, rows):
+        # 기존 로그 행과 (reservation_id, trigger_type, sent_date) 가 같으므로 upsert = 해당 컬럼만 갱신
+        # (updated_at 은 sms_logs_touch_updated_at 트리거가 갱신)
+        await self.client.table("sms_logs").upsert(
+            [{
+                "reservation_id": r['reservation_id'],
+                "trigger_type": r['trigger_type'],
+                "sent_date": str(r['sent_date']),
+                "status": r['status'],
+                "attempts": r['attempts'],
+                # 만료 처리(재발송 안 함)는 retried_at 없음 - 한 번에 보내는 행들은 같은 키를 가짐
+                **({"retried_at": r['retried_at'].isoformat()} if r.get('retried_at') else {})
+            } for r in rows],
+            on_conflict=LOG_CONFLICT_COLUMNS
+        ).execute()
@@ -0,0 +1,19 @@
+# HTML 페이지용 Jinja2 템플릿 (프로세스당 하나의 환경을 모든 라우터가 공유)
+# - jinja2 import 와 환경 생성은 첫 페이지 요청 때 수행 (API/cron 만 호출되는 cold start 에서는 로드하지 않음)
+# - 각 템플릿은 처음 렌더링할 때 한 번만 컴파일되어 환경 캐시에 유지
+#   (auto_reload 를 꺼서 렌더링마다 파일 변경 여부를 확인하지 않음)
+
+TEMPLATES_DIR = "templates"
+
+_templates = None
+
+def get_templates():
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory=TEMPLATES_DIR)
+        _templates.env.auto_reload = False
+    return _templates
+
+def render(request, name: str):
+    return get_templates().TemplateResponse(request, name)
@@ -0,0 +1,26 @@
+import hashlib
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+
+# 조건부 GET (ETag / 304) 유틸
+# - 테이블 변경 표시값(storage.table_version: 트리거가 관리하는 변경 횟수)을 한 건 조회로 구해 ETag 생성
+# - If-None-Match 가 일치하면 본문 조회/직렬화 없이 304 응답
+
+def make_etag(request: Request, *parts) -> str:
+    # 같은 테이블이라도 쿼리 파라미터가 다르면 다른 응답이므로 함께 포함
+    raw = "|".join(str(p) for p in parts) + "|" + str(request.query_params)
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+def not_modified(request: Request, etag: str):
+    """
+    클라이언트가 가진 ETag 와 같으면 304 응답 반환, 아니면 None
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def etag_response(data, etag: str):
+    # no-cache: 브라우저가 캐시를 쓰기 전에 항상 ETag 로 재검증하도록 함
+    return JSONResponse(content=jsonable_encoder(data), headers={"ETag": etag, "Cache-Control": "no-cache"})
@@ -0,0 +1,136 @@
+import os
+import time
+import bisect
+import asyncio
+from datetime import date, datetime, timedelta
+from app.config import KST
+
+# 숙소별 예약 구간 인덱스 (중복 예약 검사용)
+# - 숙소별로 [입실일, 퇴실일) 구간을 입실일 순으로 정렬해 보관
+# - 겹침 검사는 이분 탐색으로 후보 범위만 확인 (DB 조회 없음)
+# - 퇴실일이 오늘 이후인 예약만 적재 (지난 예약과의 겹침은 DB 제약조건이 확인)
+# - 이 인스턴스에서의 생성/수정/삭제는 즉시 반영, TTL 만료 시 테이블 버전을 확인해 다른 인스턴스 변경분 반영
+# - 최종 보장은 DB 의 exclusion 제약조건 (schema.sql, 기존 DB 는 마이그레이션 필수)
+#   인덱스가 놓친 충돌(다른 인스턴스의 TTL 이내 변경분 등)은 저장 시 OverlapError 로 감지
+# 퇴실일 == 다른 예약의 입실일 은 겹침이 아님 (당일 퇴실/입실 허용)
+
+RESERVATION_INDEX_TTL = float(os.environ.get("RESERVATION_INDEX_TTL", "30"))
+
+def _ordinal(value) -> int:
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10]).toordinal()
+    return value.toordinal()
+
+class AccommodationIntervals:
+    def __init__(self):
+        self.items = []  # (입실 ordinal, 예약 id, 퇴실 ordinal) - 입실일 순 정렬
+        self.max_nights = 0  # 가장 긴 숙박 일수 (탐색 범위 하한 계산용, 삭제 시 줄이지 않음)
+
+    def add(self, reservation_id, checkin, checkout):
+        bisect.insort(self.items, (checkin, reservation_id, checkout))
+        self.max_nights = max(self.max_nights, checkout - checkin)
+
+    def remove(self, reservation_id, checkin):
+        idx = bisect.bisect_left(self.items, (checkin, reservation_id))
+        if idx < len(self.items) and self.items[idx][:2] == (checkin, reservation_id):
+            del self.items[idx]
+
+    def overlaps(self, checkin, checkout, exclude_id=None) -> bool:
+        # 겹칠 수 있는 구간: checkin - max_nights < 입실 < checkout
+        lo = bisect.bisect_left(self.items, (checkin - self.max_nights + 1,))
+        hi = bisect.bisect_left(self.items, (checkout,))
+        for start, reservation_id, end in self.items[lo:hi]:
+            if reservation_id != exclude_id and end > checkin:
+                return True
+        return False
+
+# 재조회(await) 중 다른 요청이 같은 조회를 중복하지 않도록 잠금
+# 메모리 내 갱신은 이벤트 루프 한 스레드에서만 일어나므로 별도 잠금 불필요
+_lock = asyncio.Lock()
+_by_accommodation = None  # 숙소 -> AccommodationIntervals
+_by_id = {}  # 예약 id -> (숙소, 입실 ordinal)
+_version = None
+_checked_at = 0.0
+
+async def _load(storage):
+    global _by_accommodation, _by_id
+    today = datetime.now(KST).date()
+    # checkout_date > 어제 = 퇴실일이 오늘 이후
+    rows = await storage.reservation_spans(start=today - timedelta(days=1))
+    by_accommodation = {}
+    by_id = {}
+    for r in rows:
+        checkin, checkout = _ordinal(r['checkin_date']), _ordinal(r['checkout_date'])
+        by_accommodation.setdefault(r['accommodation_name'], AccommodationIntervals()).add(r['id'], checkin, checkout)
+        by_id[r['id']] = (r['accommodation_name'], checkin)
+    _by_accommodation, _by_id = by_accommodation, by_id
+
+async def _ensure_fresh(storage):
+    global _version, _checked_at
+    if _by_accommodation is not None and time.monotonic() - _checked_at < RESERVATION_INDEX_TTL:
+        return
+    async with _lock:
+        now = time.monotonic()
+        if _by_accommodation is not None and now - _checked_at < RESERVATION_INDEX_TTL:
+            return
+        version = await storage.table_version("reservations")
+        if _by_accommodation is None or version != _version:
+            await _load(storage)
+        _version = version
+        _checked_at = now
+
+async def overlaps(storage, accommodation_name, checkin_date, checkout_date, exclude_id=None) -> bool:
+    """
+    같은 숙소에 [checkin_date, checkout_date) 와 겹치는 예약이 있는지 확인
+    """
+    await _ensure_fresh(storage)
+    intervals = _by_accommodation.get(accommodation_name)
+    return bool(intervals) and intervals.overlaps(_ordinal(checkin_date), _ordinal(checkout_date), exclude_id)
+
+def upsert(reservation):
+    """
+    예약 생성/수정 후 인덱스 반영
+    """
+    if _by_accommodation is None:
+        return
+    _remove(reservation['id'])
+    checkin = _ordinal(reservation['checkin_date'])
+    _by_accommodation.setdefault(reservation['accommodation_name'], AccommodationIntervals())\
+        .add(reservation['id'], checkin, _ordinal(reservation['checkout_date']))
+    _by_id[reservation['id']] = (reservation['accommodation_name'], checkin)
+
+def remove(reservation_id):
+    """
+    예약 삭제 후 인덱스 반영
+    """
+    if _by_accommodation is None:
+        return
+    _remove(reservation_id)
+
+async def record_write(storage):
+    """
+    예약 한 건을 저장/삭제하고 upsert() / remove() 로 반영한 뒤 호출
+    테이블 버전이 그 한 번만큼만 늘었으면 새 버전을 채택 (자기 변경 때문에 다음 확인에서 전체 재적재하지 않도록)
+    그 사이 다른 인스턴스의 변경이 끼어 있으면 그대로 두고 다음 확인 때 재적재
+    """
+    global _version
+    if _by_accommodation is None or _version is None:
+        return
+    async with _lock:
+        expected = _version + 1
+        version = await storage.table_version("reservations")
+        if version == expected:
+            _version = version
+
+def _remove(reservation_id):
+    entry = _by_id.pop(reservation_id, None)
+    if entry:
+        accommodation_name, checkin = entry
+        _by_accommodation[accommodation_name].remove(reservation_id, checkin)
+
+def invalidate():
+    global _by_accommodation, _version, _checked_at
+    _by_accommodation = None
+    _by_id.clear()
+    _version = None
+    _checked_at = 0.0
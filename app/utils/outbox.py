@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta, time
+from app.config import KST
+
+# 예약 메시지 outbox (scheduled_messages)
+# - 예약 생성/수정/삭제, 템플릿 수정 시점에 (예약, 템플릿) 별 발송 시각(send_at)을 미리 계산해 저장
+# - cron 은 "send_at <= 현재 AND 미발송" 범위 조회만 하면 됨 (매 분 전체 조합 재계산 불필요)
+# - 겹쳐 실행된 cron 틱끼리는 claimed_until 선점(lease)으로 같은 행을 나눠 갖지 않음
+
+COMMON_ACCOMMODATION = '공통메세지'
+
+OUTBOX_CHUNK_SIZE = 500
+# cron 틱이 가져간 outbox 행을 다른 틱이 다시 가져가지 않도록 선점하는 시간 (초)
+# (틱이 발송 도중 중단되면 이 시간이 지난 뒤 다시 대상이 됨)
+OUTBOX_LEASE_SECONDS = 300
+
+def match_pairs(reservations, templates, today_date):
+    """
+    예약별로 today_date 에 적용할 템플릿을 골라 (예약, 템플릿) 조합 리스트를 만든다.
+    """
+    # 카테고리별로 미리 분류 (예약마다 전체 템플릿을 훑지 않도록)
+    checkin_templates = [t for t in templates if 'checkin' in t['trigger_type']]
+    checkout_templates = [t for t in templates if 'checkout' in t['trigger_type']]
+    multinight_templates = [t for t in templates if 'multinight' in t['trigger_type']]
+
+    pairs = []
+    for res in reservations:
+        checkin_date = _as_date(res['checkin_date'])
+        checkout_date = _as_date(res['checkout_date'])
+        
+        # 예약자별 적용 가능한 트리거 후보군 선정
+        candidate_triggers = []
+        
+        # (1) 입실일 당일
+        if checkin_date == today_date:
+            candidate_triggers.extend(checkin_templates)
+            
+        # (2) 퇴실일 당일
+        if checkout_date == today_date:
+            candidate_triggers.extend(checkout_templates)
+            
+        # (3) 연박 (입실일 < 오늘 < 퇴실일)
+        if checkin_date < today_date < checkout_date:
+            candidate_triggers.extend(multinight_templates)
+            
+        # (4) 숙소 이름 일치 여부 필터링 (공통메세지 포함)
+        # [Customer Request] '공통메세지'는 모든 숙소(초원고택1~3, 별장(시네/정글), 브릿지)에 적용됨
+        res_accommodation = res['accommodation_name']
+        candidate_triggers = [
+            t for t in candidate_triggers 
+            if t['accommodation_name'] == res_accommodation or t['accommodation_name'] == COMMON_ACCOMMODATION
+        ]
+        
+        # [NEW] 실행 순서 보장을 위해 정렬 (trigger_type 기준 오름차순)
+        # checkin_0900 (맛집) -> checkin_0901 (체크인안내) 순서 보장됨
+        candidate_triggers.sort(key=lambda x: x['trigger_type'])
+
+        pairs.extend((res, tmpl) for tmpl in candidate_triggers)
+    return pairs
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+def send_at_for(day, template):
+    # send_time (e.g. "09:00:00") -> 해당 날짜의 KST 발송 시각
+    send_time = time.fromisoformat(str(template['send_time']))
+    return datetime.combine(day, send_time, tzinfo=KST)
+
+def compute_schedule(reservations, templates, now_kst):
+    """
+    예약들의 남은 숙박 기간 동안 보낼 메시지 행을 계산한다. (현재 분 이전 발송분은 제외)
+    """
+    not_before = now_kst.replace(second=0, microsecond=0)
+    rows = []
+    for res in reservations:
+        day = max(_as_date(res['checkin_date']), now_kst.date())
+        last_day = _as_date(res['checkout_date'])
+        while day <= last_day:
+            for _, tmpl in match_pairs([res], templates, day):
+                send_at = send_at_for(day, tmpl)
+                if send_at < not_before:
+                    continue
+                rows.append({
+                    "reservation_id": res['id'],
+                    "template_id": tmpl['id'],
+                    "trigger_type": tmpl['trigger_type'],
+                    "send_at": send_at.isoformat()
+                })
+            day += timedelta(days=1)
+    return rows
+
+async def _insert_rows(storage, rows):
+    # 이미 발송된 같은 (예약, 트리거, 발송시각) 행이 있으면 무시
+    for start in range(0, len(rows), OUTBOX_CHUNK_SIZE):
+        await storage.insert_scheduled(rows[start:start + OUTBOX_CHUNK_SIZE])
+
+async def sync_reservation(storage, reservation, templates, now_kst=None):
+    """
+    예약 생성/수정 시 해당 예약의 미발송 outbox 를 다시 계산
+    """
+    now_kst = now_kst or datetime.now(KST)
+    await clear_reservation(storage, reservation['id'])
+    await _insert_rows(storage, compute_schedule([reservation], templates, now_kst))
+
+async def schedule_reservations(storage, reservations, templates, now_kst=None):
+    """
+    새로 등록된 예약들의 outbox 를 한 번에 계산/저장 (일괄 등록용)
+    """
+    now_kst = now_kst or datetime.now(KST)
+    await _insert_rows(storage, compute_schedule(reservations, templates, now_kst))
+
+async def clear_reservation(storage, reservation_id):
+    await storage.clear_scheduled(reservation_id=reservation_id)
+
+async def sync_template(storage, template, now_kst=None):
+    """
+    템플릿 수정 시 해당 템플릿의 미발송 outbox 를 다시 계산 (아직 퇴실 전인 예약 대상)
+    """
+    now_kst = now_kst or datetime.now(KST)
+    await storage.clear_scheduled(template_id=template['id'])
+
+    accommodation = None
+    if template['accommodation_name'] != COMMON_ACCOMMODATION:
+        accommodation = template['accommodation_name']
+    reservations = await storage.active_reservations(now_kst.date(), accommodation)
+
+    await _insert_rows(storage, compute_schedule(reservations, [template], now_kst))
+
+async def rebuild(storage, templates, now_kst=None):
+    """
+    전체 미발송 outbox 재계산 (초기 적용/복구용)
+    """
+    now_kst = now_kst or datetime.now(KST)
+    await storage.clear_scheduled()
+    reservations = await storage.active_reservations(now_kst.date())
+    rows = compute_schedule(reservations, templates, now_kst)
+    await _insert_rows(storage, rows)
+    return len(rows)
+
+async def fetch_due(storage, window_start, window_end):
+    """
+    window_start <= send_at <= window_end 이고 아직 발송되지 않은 outbox 행 (예약 정보 포함)
+    """
+    return await storage.fetch_due(window_start, window_end)
+
+async def claim_due(storage, due_rows, now_kst):
+    """
+    fetch_due 로 가져온 행을 선점 (겹쳐 실행된 틱이 같은 행을 함께 보내지 않도록)
+    반환값: (이번 틱이 선점한 행, 다른 틱이 선점 중인 행)
+    """
+    lease_until = now_kst + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    ids = [row['id'] for row in due_rows]
+    claimed = set()
+    for start in range(0, len(ids), OUTBOX_CHUNK_SIZE):
+        claimed.update(await storage.claim_scheduled(ids[start:start + OUTBOX_CHUNK_SIZE], now_kst, lease_until))
+    return [row for row in due_rows if row['id'] in claimed], [row for row in due_rows if row['id'] not in claimed]
+
+async def mark_sent(storage, ids, now_kst):
+    for start in range(0, len(ids), OUTBOX_CHUNK_SIZE):
+        await storage.mark_scheduled_sent(ids[start:start + OUTBOX_CHUNK_SIZE], now_kst)
+
+# cron 처리 워터마크 (마지막으로 성공한 처리 구간의 끝 시각)
+CRON_STATE_NAME = "outbox"
+
+async def get_watermark(storage, name=CRON_STATE_NAME):
+    watermark = await storage.get_watermark(name)
+    if not watermark:
+        return None
+    return datetime.fromisoformat(watermark).astimezone(KST)
+
+async def set_watermark(storage, watermark, name=CRON_STATE_NAME):
+    await storage.set_watermark(name, watermark)
@@ -0,0 +1,66 @@
+import io
+import time
+import threading
+import contextlib
+
+# cron 틱 진단 유틸
+# - phase(): 단계별 경과 시간(ms)을 timings dict 에 누적
+# - profile_top(): cProfile 결과에서 자체 실행 시간 기준 상위 함수 목록
+#   (cProfile / pstats 는 프로파일 요청 때만 import)
+
+# 프로세스당 동시에 하나의 프로파일만 측정 (cProfile 은 겹쳐서 켤 수 없음)
+_profile_lock = threading.Lock()
+
+class ProfilerBusy(Exception):
+    pass
+
+@contextlib.contextmanager
+def phase(timings: dict, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def rounded(timings: dict):
+    return {name: round(ms, 3) for name, ms in timings.items()}
+
+@contextlib.contextmanager
+def profiled():
+    """
+    블록 실행 동안 cProfile 측정. yield 되는 Profile 객체를 profile_top() 에 전달
+    (이벤트 루프 스레드에서 측정하므로 같은 시점에 처리된 다른 요청도 포함될 수 있음)
+    이미 측정 중이면 기다리지 않고 ProfilerBusy
+    """
+    import cProfile
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("profile already running")
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+    finally:
+        _profile_lock.release()
+
+def profile_top(profiler: "cProfile.Profile", limit: int = 20):
+    """
+    자체 실행 시간(tottime) 기준 상위 limit 개 함수
+    (누적 시간 기준이면 이벤트 루프/코루틴 래퍼가 상위를 차지하므로)
+    """
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{lineno}({func})",
+            "calls": nc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3)
+        })
+    rows.sort(key=lambda r: r["tottime_ms"], reverse=True)
+    return rows[:limit]
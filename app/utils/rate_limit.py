@@ -0,0 +1,98 @@
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# 외부 API 호출 속도 제한 (토큰 버킷) + 스로틀 응답 재시도 대기 시간 계산
+# - 초당 rate 개씩 토큰이 충전되고 최대 burst 개까지 모임 (요청 1건 = 토큰 1개)
+# - 토큰이 없으면 충전될 때까지 대기 (동기 함수는 time.sleep, 비동기 함수는 asyncio.sleep)
+# - 429 등 스로틀 응답을 받으면 pause() 로 모든 호출을 Retry-After / 백오프 시간 동안 멈춤
+# 프로세스(서버리스 인스턴스) 단위로 동작하므로, 인스턴스가 여러 개면 rate 를 나눠서 설정
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = float(rate)
+        self.capacity = float(max(burst or rate, 1))
+        self.tokens = self.capacity
+        # tokens 가 기준으로 하는 시각 (pause 중이면 미래 시각 - 그때부터 다시 충전)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        # 동기 함수(스레드)와 이벤트 루프에서 함께 사용하므로 잠금
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        토큰을 미리 차감하고, 사용 가능해질 때까지 기다려야 하는 시간(초)을 반환
+        (부족분은 빚으로 남겨서 먼저 예약한 호출부터 순서대로 진행)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            ready_at = self.updated + max(0.0, -self.tokens) / self.rate
+            return max(0.0, ready_at - now, self.resume_at - now)
+
+    def pause(self, seconds: float):
+        """
+        seconds 동안 새 호출을 멈추고, 이후 토큰을 0 부터 다시 충전 (스로틀 응답 직후 몰아서 보내지 않도록)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            resume_at = now + seconds
+            if resume_at > self.resume_at:
+                self.resume_at = resume_at
+            if resume_at > self.updated:
+                self.tokens = min(self.tokens, 0.0)
+                self.updated = resume_at
+
+    def _remaining_pause(self) -> float:
+        with self._lock:
+            return self.resume_at - time.monotonic()
+
+    def acquire(self, tokens: float = 1):
+        time.sleep(self.reserve(tokens))
+        # 대기 중에 다른 호출이 pause() 했으면 남은 시간만큼 더 기다림
+        remaining = self._remaining_pause()
+        while remaining > 0:
+            time.sleep(remaining)
+            remaining = self._remaining_pause()
+
+    async def acquire_async(self, tokens: float = 1):
+        await asyncio.sleep(self.reserve(tokens))
+        remaining = self._remaining_pause()
+        while remaining > 0:
+            await asyncio.sleep(remaining)
+            remaining = self._remaining_pause()
+
+def parse_retry_after(value) -> float:
+    """
+    Retry-After 헤더 (초 단위 숫자 또는 HTTP 날짜) -> 대기 시간(초). 없거나 해석할 수 없으면 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    지수 백오프 + full jitter: 0 ~ min(cap, base * 2^attempt) 사이 임의 값
+    (동시에 스로틀된 호출들이 같은 시각에 다시 몰리지 않도록)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,126 @@
+import hashlib
+import threading
+from string import Formatter
+
+# 메시지 템플릿 렌더러
+# - 템플릿 문자열을 한 번만 파싱(컴파일)해서 (고정 문자열, 치환 변수) 조각 목록으로 보관
+# - 사용 가능한 변수는 PLACEHOLDERS 에 정의 (저장 시점에 검증)
+# - 렌더링은 조각을 이어붙이기만 하므로 str.format 보다 빠르고 발송 루프 중에 예외가 나지 않음
+
+# 사용 가능한 치환 변수 -> 예약 정보에서 값을 만드는 함수
+PLACEHOLDERS = {
+    "name": lambda r: r.get('guest_name', ''),
+    "accommodation": lambda r: r.get('accommodation_name', ''),
+    "checkin_date": lambda r: str(r.get('checkin_date', '')),
+    "checkout_date": lambda r: str(r.get('checkout_date', '')),
+}
+
+class TemplateError(ValueError):
+    pass
+
+class CompiledTemplate:
+    def __init__(self, source: str, parts: list):
+        self.source = source
+        self.parts = parts  # [(literal, field_name or None, format_spec)]
+        self.fields = {field for _, field, _ in parts if field}
+
+    def render(self, values: dict) -> str:
+        out = []
+        for literal, field, spec in self.parts:
+            out.append(literal)
+            if field:
+                value = values.get(field, '')
+                out.append(format(value, spec) if spec else str(value))
+        return "".join(out)
+
+def compile_template(source: str) -> CompiledTemplate:
+    """
+    템플릿 문자열을 파싱하고 변수 이름을 검증한다. 잘못된 경우 TemplateError.
+    (중괄호 자체를 쓰려면 {{ }} 로 입력)
+    """
+    parts = []
+    try:
+        for literal, field, spec, conversion in Formatter().parse(source or ""):
+            if field is None:
+                parts.append((literal, None, None))
+                continue
+            if field == "" or field.isdigit():
+                raise TemplateError("변수 이름이 없는 {} 는 사용할 수 없습니다. 중괄호 자체는 {{ }} 로 입력하세요.")
+            if field not in PLACEHOLDERS:
+                allowed = ", ".join("{" + k + "}" for k in PLACEHOLDERS)
+                raise TemplateError(f"알 수 없는 변수 {{{field}}} 입니다. 사용 가능: {allowed}")
+            if conversion:
+                raise TemplateError(f"변수 {{{field}}} 에 변환(!{conversion})은 사용할 수 없습니다.")
+            if spec:
+                try:
+                    format("", spec)
+                except ValueError:
+                    raise TemplateError(f"변수 {{{field}}} 의 형식 지정({spec})이 잘못되었습니다.")
+            parts.append((literal, field, spec or None))
+    except TemplateError:
+        raise
+    except ValueError as e:
+        # 짝이 맞지 않는 중괄호 등
+        raise TemplateError(f"템플릿 형식 오류: {e}. 중괄호 자체는 {{{{ }}}} 로 입력하세요.")
+    return CompiledTemplate(source or "", parts)
+
+def validate_template(content: str, subject: str = None):
+    """
+    저장 전 검증용. 문제가 있으면 TemplateError.
+    """
+    compile_template(content)
+    if subject:
+        compile_template(subject)
+
+# 템플릿 id 별 컴파일 캐시: id -> (내용 해시, (본문, 제목))
+_lock = threading.Lock()
+_compiled = {}
+
+def _content_hash(template: dict) -> str:
+    raw = (template.get('content') or "") + "\0" + (template.get('subject') or "")
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def get_compiled(template: dict):
+    """
+    템플릿(dict)을 (본문, 제목) 컴파일 결과로 반환. id + 내용 해시로 캐시.
+    제목이 없으면 제목 자리는 None.
+    """
+    digest = _content_hash(template)
+    key = template.get('id')
+    with _lock:
+        cached = _compiled.get(key)
+        if cached and cached[0] == digest:
+            return cached[1]
+
+    subject_tmpl = None
+    if template.get('subject'):
+        try:
+            subject_tmpl = compile_template(template['subject'])
+        except TemplateError:
+            # 제목은 포맷팅 실패 시 원본 그대로 사용 (기존 동작 유지)
+            subject_tmpl = CompiledTemplate(template['subject'], [(template['subject'], None, None)])
+
+    compiled = (compile_template(template.get('content')), subject_tmpl)
+    if key is not None:
+        with _lock:
+            _compiled[key] = (digest, compiled)
+    return compiled
+
+def reservation_values(reservation: dict) -> dict:
+    return {key: fn(reservation) for key, fn in PLACEHOLDERS.items()}
+
+def render_batch(template: dict, reservations: list):
+    """
+    하나의 템플릿으로 여러 예약을 렌더링.
+    반환값: [(본문, 제목 or None), ...]  (예약 순서와 동일)
+    템플릿 자체가 잘못된 경우 TemplateError.
+    """
+    content_tmpl, subject_tmpl = get_compiled(template)
+    results = []
+    for reservation in reservations:
+        values = reservation_values(reservation)
+        results.append((
+            content_tmpl.render(values),
+            subject_tmpl.render(values) if subject_tmpl else None
+        ))
+    return results
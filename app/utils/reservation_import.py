@@ -0,0 +1,147 @@
+import csv
+import json
+import io
+from datetime import date
+from pydantic import ValidationError
+from fastapi.encoders import jsonable_encoder
+
+from app.models import ReservationCreate
+from app.storage import OverlapError
+
+# 예약 일괄 등록 (JSON / CSV)
+# - 숙소별로 입실일 순 정렬 후 기존 예약과 배치 내부 예약을 한 번의 sweep 으로 겹침 검사
+# - 통과한 행은 청크 단위 bulk insert, 행별 결과(accepted / rejected) 반환
+
+IMPORT_CHUNK_SIZE = 500
+
+CSV_COLUMNS = ["guest_name", "phone_number", "accommodation_name", "checkin_date", "checkout_date", "memo"]
+
+def parse_rows(body: bytes, content_type: str):
+    """
+    요청 본문을 dict 리스트로 변환 (text/csv 이면 CSV, 아니면 JSON 배열)
+    """
+    if "csv" in (content_type or ""):
+        text = body.decode("utf-8-sig")
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+    data = json.loads(body or b"[]")
+    if isinstance(data, dict):
+        data = data.get("reservations", [])
+    if not isinstance(data, list):
+        raise ValueError("JSON body must be an array of reservations")
+    return data
+
+def validate_rows(rows):
+    """
+    반환값: (검증 통과 [(행 번호, 데이터 dict)], 거절 결과 리스트)
+    """
+    valid = []
+    rejected = []
+    for idx, raw in enumerate(rows):
+        try:
+            reservation = ReservationCreate(**{k: v for k, v in raw.items() if v not in ("", None)})
+        except (ValidationError, TypeError, AttributeError) as e:
+            rejected.append({"row": idx, "status": "rejected", "reason": f"invalid row: {e}"})
+            continue
+        if reservation.checkout_date <= reservation.checkin_date:
+            rejected.append({"row": idx, "status": "rejected", "reason": "checkout_date must be after checkin_date"})
+            continue
+        valid.append((idx, jsonable_encoder(reservation)))
+    return valid, rejected
+
+async def fetch_existing(storage, valid):
+    """
+    배치와 겹칠 수 있는 기존 예약만 한 번에 조회 (해당 숙소, 배치 전체 기간)
+    """
+    if not valid:
+        return []
+    accommodations = sorted({r['accommodation_name'] for _, r in valid})
+    min_checkin = min(r['checkin_date'] for _, r in valid)
+    max_checkout = max(r['checkout_date'] for _, r in valid)
+    return await storage.reservation_spans(accommodations, start=min_checkin, end=max_checkout)
+
+def sweep(valid, existing):
+    """
+    숙소별 sweep-line 겹침 검사.
+    반환값: (통과 [(행 번호, 데이터)], 거절 결과 리스트)
+    - 기존 예약과 겹치면 거절
+    - 배치 안에서 겹치면 입실일이 빠른 행(같으면 앞 행)을 받고 나머지는 거절
+    """
+    batch_by_acc = {}
+    for idx, r in valid:
+        batch_by_acc.setdefault(r['accommodation_name'], []).append(
+            (date.fromisoformat(r['checkin_date']), date.fromisoformat(r['checkout_date']), idx, r))
+
+    existing_by_acc = {}
+    for e in existing:
+        existing_by_acc.setdefault(e['accommodation_name'], []).append(
+            (date.fromisoformat(e['checkin_date'][:10]), date.fromisoformat(e['checkout_date'][:10]), e['id']))
+
+    accepted = []
+    rejected = []
+    for acc, batch in batch_by_acc.items():
+        batch.sort(key=lambda b: (b[0], b[2]))
+        fixed = sorted(existing_by_acc.get(acc, []))
+
+        j = 0
+        existing_end, existing_id = None, None  # 지금까지 시작한 기존 예약 중 가장 늦은 퇴실
+        accepted_end, accepted_row = None, None  # 지금까지 받은 배치 행 중 가장 늦은 퇴실
+
+        for start, end, idx, r in batch:
+            while j < len(fixed) and fixed[j][0] <= start:
+                if existing_end is None or fixed[j][1] > existing_end:
+                    existing_end, existing_id = fixed[j][1], fixed[j][2]
+                j += 1
+
+            reason = None
+            if existing_end is not None and existing_end > start:
+                reason = f"overlaps existing reservation {existing_id}"
+            elif j < len(fixed) and fixed[j][0] < end:
+                reason = f"overlaps existing reservation {fixed[j][2]}"
+            elif accepted_end is not None and accepted_end > start:
+                reason = f"overlaps row {accepted_row} in this import"
+
+            if reason:
+                rejected.append({"row": idx, "status": "rejected", "reason": reason})
+                continue
+
+            accepted.append((idx, r))
+            if accepted_end is None or end > accepted_end:
+                accepted_end, accepted_row = end, idx
+
+    accepted.sort(key=lambda a: a[0])
+    return accepted, rejected
+
+async def insert_accepted(storage, accepted, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    통과한 행을 청크 단위로 bulk insert.
+    반환값: (저장된 예약 리스트, 결과 리스트)
+    """
+    inserted = []
+    results = []
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start:start + chunk_size]
+        try:
+            rows = await storage.insert_reservations([r for _, r in chunk])
+        except Exception as e:
+            # 청크 전체 실패 시 (동시 등록으로 인한 겹침 등) 한 건씩 재시도해서 행별로 보고
+            print(f"Error inserting reservation chunk ({len(chunk)} rows): {e}")
+            for idx, r in chunk:
+                try:
+                    row = await storage.insert_reservation(r)
+                    if not row:
+                        results.append({"row": idx, "status": "rejected", "reason": "failed to create reservation"})
+                        continue
+                    inserted.append(row)
+                    results.append({"row": idx, "status": "accepted", "id": row['id']})
+                except OverlapError:
+                    results.append({"row": idx, "status": "rejected", "reason": "overlaps existing reservation"})
+                except Exception as row_error:
+                    results.append({"row": idx, "status": "rejected", "reason": str(row_error)})
+            continue
+
+        # insert 결과는 요청 순서와 같음
+        for (idx, _), row in zip(chunk, rows):
+            inserted.append(row)
+            results.append({"row": idx, "status": "accepted", "id": row['id']})
+    return inserted, results
@@ -0,0 +1,158 @@
+import os
+import random
+from datetime import datetime, timedelta
+from app.utils.sms import is_failed, is_rejected
+
+# 발송 실패 메시지 재시도 큐 (sms_retry_queue)
+# - cron 틱에서 발송에 실패한 메시지를 렌더링된 내용 그대로 저장 (틱 안에서는 재시도하지 않음)
+# - Solapi 가 접수하지 않은 것이 확실한 실패(is_rejected)만 다시 보냄
+#   타임아웃/연결 끊김/그 밖의 5xx 는 이미 접수됐을 수 있어 재발송하지 않고 failed 로만 기록 (중복 발송 방지)
+# - /api/cron/retry 가 재시도 시각이 된 메시지를 배치로 가져와 다시 발송
+# - 실패할 때마다 대기 시간을 지수적으로 늘리고, 최대 시도 횟수에 도달하면 포기 (로그는 failed 로 남음)
+# - 발송일이 지났거나 최초 실패 후 너무 오래된 메시지는 보내지 않고 만료 (로그는 expired)
+#   (재시도 처리가 늦어지거나 멈췄다가 재개돼도 "오늘 15시 입실" 같은 당일 안내가 몇 시간 뒤/다음 날 나가지 않도록)
+# - 결과(status / retried_at / attempts)는 원래의 sms_logs 행에 반영 (sent_at 은 최초 발송 시각 유지)
+
+# 최대 발송 시도 횟수 (최초 발송 포함, 1 이면 재시도 안 함)
+SMS_RETRY_MAX_ATTEMPTS = int(os.environ.get("SMS_RETRY_MAX_ATTEMPTS", "5"))
+# 재시도 대기 시간 (초): 1회 실패 후 base, 이후 2배씩 (최대 max)
+SMS_RETRY_BASE_SECONDS = float(os.environ.get("SMS_RETRY_BASE_SECONDS", "60"))
+SMS_RETRY_MAX_SECONDS = float(os.environ.get("SMS_RETRY_MAX_SECONDS", "3600"))
+# 재시도 처리 1회에 다시 보내는 최대 메시지 수
+SMS_RETRY_BATCH_SIZE = int(os.environ.get("SMS_RETRY_BATCH_SIZE", "200"))
+# 최초 실패(큐 등록) 후 이 시간(분)이 지난 메시지는 재발송하지 않음
+SMS_RETRY_MAX_AGE_MINUTES = float(os.environ.get("SMS_RETRY_MAX_AGE_MINUTES", "120"))
+# 가져간 메시지를 다른 재시도 처리가 다시 가져가지 않도록 미뤄두는 시간 (초)
+# (처리 도중 중단되면 이 시간이 지난 뒤 다시 대상이 됨)
+SMS_RETRY_LEASE_SECONDS = 300
+
+RETRY_CHUNK_SIZE = 500
+
+def next_attempt_at(attempts, now):
+    """
+    attempts 번 시도(모두 실패)한 뒤의 다음 시도 시각
+    대기 시간 base * 2^(attempts-1) (최대 max) 의 50~100% 사이 임의 값 (동시에 실패한 메시지들이 한꺼번에 몰리지 않도록)
+    """
+    delay = min(SMS_RETRY_MAX_SECONDS, SMS_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+    return now + timedelta(seconds=random.uniform(delay / 2, delay))
+
+def _error_text(send_result):
+    if isinstance(send_result, dict):
+        return str(send_result.get('error') or send_result.get('detail') or send_result)
+    return str(send_result)
+
+def build_retry_rows(messages, send_results, log_rows, statuses, now_kst):
+    """
+    접수 거부가 확실한 실패이고 로그가 새로 기록된 메시지만 재시도 큐 행으로 변환
+    (결과가 불확실한 실패: 중복 발송 위험, duplicate: 같은 날 이미 처리된 조합,
+     로그 기록 실패: 결과를 반영할 로그가 없음 -> 제외)
+    """
+    if SMS_RETRY_MAX_ATTEMPTS <= 1:
+        return []
+
+    rows = []
+    for msg, send_result, log_row, status in zip(messages, send_results, log_rows, statuses):
+        if not is_rejected(send_result) or status != 'inserted':
+            continue
+        rows.append({
+            "reservation_id": log_row['reservation_id'],
+            "trigger_type": log_row['trigger_type'],
+            "sent_date": log_row['sent_date'],
+            "phone_number": msg['reservation']['phone_number'],
+            "content": msg['content'],
+            "subject": msg['subject'],
+            "attempts": 1,
+            "next_attempt_at": next_attempt_at(1, now_kst),
+            "last_error": _error_text(send_result)
+        })
+    return rows
+
+async def enqueue(storage, rows):
+    for start in range(0, len(rows), RETRY_CHUNK_SIZE):
+        await storage.enqueue_retries(rows[start:start + RETRY_CHUNK_SIZE])
+
+async def claim_due(storage, now_kst, limit=SMS_RETRY_BATCH_SIZE):
+    """
+    재시도 시각이 된 메시지를 최대 limit 건 가져옴 (가져간 메시지는 SMS_RETRY_LEASE_SECONDS 동안 다른 처리에서 제외)
+    """
+    return await storage.claim_retries(now_kst, now_kst + timedelta(seconds=SMS_RETRY_LEASE_SECONDS), limit)
+
+def is_expired(row, now_kst):
+    """
+    발송일(sent_date)이 오늘(KST) 이전이거나, 큐에 등록된 지 SMS_RETRY_MAX_AGE_MINUTES 가 지났으면 만료
+    """
+    if str(row['sent_date'])[:10] < str(now_kst.date()):
+        return True
+    created_at = row['created_at']
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return now_kst - created_at > timedelta(minutes=SMS_RETRY_MAX_AGE_MINUTES)
+
+async def expire(storage, rows):
+    """
+    만료된 메시지를 보내지 않고 큐에서 삭제, 로그 status 는 expired (retried_at / attempts 는 그대로)
+    """
+    for row in rows:
+        print(f"[RETRY] Expired, not resending: reservation_id={row['reservation_id']}, trigger={row['trigger_type']}, sent_date={row['sent_date']}")
+    ids = [row['id'] for row in rows]
+    for start in range(0, len(ids), RETRY_CHUNK_SIZE):
+        await storage.delete_retries(ids[start:start + RETRY_CHUNK_SIZE])
+    log_updates = [{
+        "reservation_id": row['reservation_id'],
+        "trigger_type": row['trigger_type'],
+        "sent_date": row['sent_date'],
+        "status": 'expired',
+        "attempts": row['attempts']
+    } for row in rows]
+    for start in range(0, len(log_updates), RETRY_CHUNK_SIZE):
+        await storage.update_log_results(log_updates[start:start + RETRY_CHUNK_SIZE])
+
+async def record_results(storage, rows, send_results, now_kst):
+    """
+    재발송 결과 반영
+    - 성공 / 최대 횟수 도달 / 결과가 불확실한 실패(타임아웃 등 - 다시 보내지 않음): 큐에서 삭제
+    - 접수 거부: attempts 증가, 다음 시도 시각을 뒤로 미룸
+    큐를 먼저 갱신한 뒤 로그를 갱신 (중간에 중단돼도 같은 메시지를 다시 보내지 않도록)
+    반환값: {"sent", "rescheduled", "gave_up", "unclear"} 건수
+    """
+    summary = {"sent": 0, "rescheduled": 0, "gave_up": 0, "unclear": 0}
+    finished_ids, rescheduled, log_updates = [], [], []
+
+    for row, send_result in zip(rows, send_results):
+        attempts = row['attempts'] + 1
+        failed = is_failed(send_result)
+        if not failed:
+            summary["sent"] += 1
+            finished_ids.append(row['id'])
+        elif not is_rejected(send_result):
+            summary["unclear"] += 1
+            finished_ids.append(row['id'])
+            print(f"[RETRY] Unclear result, not resending: reservation_id={row['reservation_id']}, trigger={row['trigger_type']}")
+        elif attempts >= SMS_RETRY_MAX_ATTEMPTS:
+            summary["gave_up"] += 1
+            finished_ids.append(row['id'])
+            print(f"[RETRY] Giving up after {attempts} attempts: reservation_id={row['reservation_id']}, trigger={row['trigger_type']}")
+        else:
+            summary["rescheduled"] += 1
+            rescheduled.append({
+                **row,
+                "attempts": attempts,
+                "next_attempt_at": next_attempt_at(attempts, now_kst),
+                "last_error": _error_text(send_result)
+            })
+        log_updates.append({
+            "reservation_id": row['reservation_id'],
+            "trigger_type": row['trigger_type'],
+            "sent_date": row['sent_date'],
+            "status": 'failed' if failed else 'success',
+            "retried_at": now_kst,
+            "attempts": attempts
+        })
+
+    for start in range(0, len(rescheduled), RETRY_CHUNK_SIZE):
+        await storage.update_retries(rescheduled[start:start + RETRY_CHUNK_SIZE])
+    for start in range(0, len(finished_ids), RETRY_CHUNK_SIZE):
+        await storage.delete_retries(finished_ids[start:start + RETRY_CHUNK_SIZE])
+    for start in range(0, len(log_updates), RETRY_CHUNK_SIZE):
+        await storage.update_log_results(log_updates[start:start + RETRY_CHUNK_SIZE])
+    return summary
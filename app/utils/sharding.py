@@ -0,0 +1,83 @@
+import zlib
+
+# cron 작업 분할 (GET /api/cron?shard=i&shards=n&shard_by=reservation|accommodation)
+# - 같은 분의 발송 대상을 n 개로 나눠 여러 호출이 병렬로 처리 (서버리스 함수 제한 시간 대응)
+# - 예약은 정확히 하나의 샤드에만 속하므로 샤드끼리 겹치지 않음
+#   reservation: 예약 id % n / accommodation: 숙소 이름 crc32 % n (같은 숙소는 항상 같은 샤드)
+# - 샤드별 응답은 combine_reports() 로 하나의 보고서로 합침
+
+SHARD_KEYS = ("reservation", "accommodation")
+MAX_SHARDS = 64
+
+class ShardSpec:
+    def __init__(self, index: int = 0, count: int = 1, by: str = "reservation"):
+        if by not in SHARD_KEYS:
+            raise ValueError(f"shard_by must be one of {', '.join(SHARD_KEYS)}")
+        if not 1 <= count <= MAX_SHARDS:
+            raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+        if not 0 <= index < count:
+            raise ValueError("shard must be between 0 and shards - 1")
+        self.index = index
+        self.count = count
+        self.by = by
+
+    def shard_of(self, reservation) -> int:
+        # 예약 정보가 없는 행(삭제된 예약의 outbox 등)은 0번 샤드가 처리
+        if not reservation:
+            return 0
+        if self.by == "accommodation":
+            # hash() 는 프로세스마다 값이 달라지므로 고정 해시 사용
+            return zlib.crc32(reservation['accommodation_name'].encode()) % self.count
+        return int(reservation['id']) % self.count
+
+    def owns(self, reservation) -> bool:
+        return self.count == 1 or self.shard_of(reservation) == self.index
+
+    def state_name(self, base: str) -> str:
+        """
+        샤드별 cron 상태(워터마크) 이름. 분할하지 않으면 base 그대로
+        (샤드마다 처리 구간이 따로 전진해야 다른 샤드의 미처리분을 건너뛰지 않음)
+        """
+        if self.count == 1:
+            return base
+        return f"{base}:{self.by}:{self.index}/{self.count}"
+
+    def as_dict(self):
+        return {"index": self.index, "count": self.count, "by": self.by}
+
+def combine_reports(reports):
+    """
+    샤드별 /api/cron 응답을 하나의 보고서로 합침
+    - processed / skipped_duplicate: 합계, log_failed: 이어붙임, render_failed: 템플릿별 예약 수 합계
+    - timings_ms: 단계별 최댓값 (샤드는 병렬로 실행되므로 가장 느린 샤드가 전체 소요 시간을 결정)
+    - missing_shards: 응답이 없는 샤드 번호 (모든 샤드가 처리됐는지 확인용)
+    """
+    shards = [r.get("shard") or {"index": 0, "count": 1, "by": "reservation"} for r in reports]
+    counts = {s["count"] for s in shards}
+    keys = {s["by"] for s in shards}
+    if len(counts) > 1 or len(keys) > 1:
+        raise ValueError("reports come from different shard specs")
+    count = counts.pop() if counts else 1
+
+    render_failed = {}
+    for report in reports:
+        for failed in report.get("render_failed", []):
+            entry = render_failed.setdefault(failed["template_id"], {**failed, "reservations": 0})
+            entry["reservations"] += failed["reservations"]
+
+    timings = {}
+    for report in reports:
+        for name, ms in report.get("timings_ms", {}).items():
+            timings[name] = max(timings.get(name, 0.0), ms)
+
+    seen = {s["index"] for s in shards}
+    return {
+        "status": "ok" if all(r.get("status") == "ok" for r in reports) else "error",
+        "shards": {"count": count, "by": keys.pop() if keys else "reservation", "reported": sorted(seen)},
+        "missing_shards": [i for i in range(count) if i not in seen],
+        "processed": sum(r.get("processed", 0) for r in reports),
+        "skipped_duplicate": sum(r.get("skipped_duplicate", 0) for r in reports),
+        "log_failed": [failed for r in reports for failed in r.get("log_failed", [])],
+        "render_failed": list(render_failed.values()),
+        "timings_ms": timings
+    }
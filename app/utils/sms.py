@@ -1,18 +1,38 @@
 import os
-import requests
+import asyncio
 import uuid
 import hmac
 import hashlib
 import datetime
-from dotenv import load_dotenv
+from app import config  # .env 로드
+from app.utils.metrics import SOLAPI_REQUEST_DURATION
+from app.utils.rate_limit import TokenBucket, parse_retry_after, backoff_delay
 
-# .env 파일 로드
-load_dotenv()
+# requests / httpx 는 실제 발송 시점에 import (cold start 단축 - 발송하지 않는 요청은 로드하지 않음)
 
 SOLAPI_API_KEY = os.environ.get("SOLAPI_API_KEY")
 SOLAPI_SECRET_KEY = os.environ.get("SOLAPI_SECRET_KEY")
 SOLAPI_SENDER_NUMBER = os.environ.get("SOLAPI_SENDER_NUMBER")
 
+SOLAPI_BASE_URL = "https://api.solapi.com"
+
+# 타임아웃/커넥션 풀 설정 (초 단위)
+SOLAPI_CONNECT_TIMEOUT = float(os.environ.get("SOLAPI_CONNECT_TIMEOUT", "3"))
+SOLAPI_READ_TIMEOUT = float(os.environ.get("SOLAPI_READ_TIMEOUT", "10"))
+SOLAPI_MAX_CONNECTIONS = int(os.environ.get("SOLAPI_MAX_CONNECTIONS", "10"))
+
+# 호출 속도 제한 (초당 API 요청 수, 순간 최대 요청 수) - 인스턴스 단위
+SOLAPI_RATE_LIMIT = float(os.environ.get("SOLAPI_RATE_LIMIT", "10"))
+SOLAPI_RATE_BURST = float(os.environ.get("SOLAPI_RATE_BURST", str(SOLAPI_RATE_LIMIT)))
+# 스로틀 응답 재시도 (횟수, 지수 백오프 시작/최대 대기 초)
+# 요청이 거부된 것이 확실한 응답만 재시도 (그 밖의 5xx/타임아웃은 이미 접수됐을 수 있어 중복 발송 위험)
+SOLAPI_MAX_RETRIES = int(os.environ.get("SOLAPI_MAX_RETRIES", "3"))
+SOLAPI_BACKOFF_BASE = float(os.environ.get("SOLAPI_BACKOFF_BASE", "0.5"))
+SOLAPI_BACKOFF_MAX = float(os.environ.get("SOLAPI_BACKOFF_MAX", "10"))
+SOLAPI_RETRY_STATUSES = {429, 503}
+
+solapi_bucket = TokenBucket(SOLAPI_RATE_LIMIT, SOLAPI_RATE_BURST)
+
 # 1. 날짜 구하는 함수 (최신 방식으로 개선)
 def get_iso_datetime():
     # 현재 시간을 구해서 ISO 8601 형식(표준 시간대 포함)으로 반환
@@ -35,15 +55,8 @@ def get_headers():
         'Content-Type': 'application/json'
     }
 
-# 4. 문자 발송 함수
-def send_sms(to_number: str, text: str, subject: str = None):
-    # API 키가 없는 경우 (로컬 테스트 중 실수 방지)
-    if not SOLAPI_API_KEY or not SOLAPI_SECRET_KEY:
-        print(f"[MOCK SEND] To: {to_number}, Subject: {subject}, Content: {text}")
-        return {"status": "mock_success", "messageId": "mock_id"}
-
-    url = "https://api.solapi.com/messages/v4/send"
-    
+# 4. 메시지 본문(payload) 생성 함수
+def build_message(to_number: str, text: str, subject: str = None):
     # [안전장치] 전화번호에서 하이픈(-) 제거
     clean_number = to_number.replace("-", "").strip()
 
@@ -56,23 +69,275 @@ def send_sms(to_number: str, text: str, subject: str = None):
     if subject:
         message_payload["subject"] = subject
 
+    return message_payload
+
+def is_failed(send_result):
+    # 발송 결과(send_sms / send_sms_batch 결과 항목)가 실패인지
+    return isinstance(send_result, dict) and ('error' in send_result or send_result.get('status') == 'error')
+
+def is_rejected(send_result):
+    # 실패 중 Solapi 가 접수하지 않은 것이 확실한 경우 (failedMessageList 항목, 4xx / 429 / 503 응답) - 다시 보내도 안전
+    # 타임아웃/연결 끊김/그 밖의 5xx 는 이미 접수됐을 수 있으므로 False (다시 보내면 중복 발송 위험)
+    return is_failed(send_result) and bool(send_result.get('rejected'))
+
+def _rejected_status(status_code: int) -> bool:
+    return 400 <= status_code < 500 or status_code in SOLAPI_RETRY_STATUSES
+
+# 5. 속도 제한 + 스로틀 재시도를 거치는 POST (동기 / 비동기)
+# 최종 응답이 2xx 가 아니면 HTTP 에러 예외 발생 (raise_for_status)
+def _retry_delay(res, attempt: int):
+    """
+    스로틀 응답이면 다시 보내기 전 대기 시간(초), 재시도하지 않을 응답이면 None
+    Retry-After 가 있으면 그 이상 기다리고, SOLAPI_BACKOFF_MAX 보다 길면 재시도하지 않음
+    """
+    if res.status_code not in SOLAPI_RETRY_STATUSES or attempt >= SOLAPI_MAX_RETRIES:
+        return None
+    delay = backoff_delay(attempt, SOLAPI_BACKOFF_BASE, SOLAPI_BACKOFF_MAX)
+    retry_after = parse_retry_after(res.headers.get("Retry-After"))
+    if retry_after is not None:
+        if retry_after > SOLAPI_BACKOFF_MAX:
+            return None
+        delay = max(delay, retry_after)
+    return delay
+
+def _post(path: str, body: dict, endpoint: str):
+    import requests
+
+    attempt = 0
+    while True:
+        solapi_bucket.acquire()
+        # 헤더를 매 요청마다 새로 생성해야 함 (시간 정보 때문)
+        with SOLAPI_REQUEST_DURATION.time(endpoint=endpoint, outcome="error") as labels:
+            res = requests.post(f"{SOLAPI_BASE_URL}{path}", json=body, headers=get_headers(),
+                                timeout=(SOLAPI_CONNECT_TIMEOUT, SOLAPI_READ_TIMEOUT))
+            delay = _retry_delay(res, attempt)
+            if delay is None:
+                res.raise_for_status() # 200 OK가 아니면 에러 발생시킴
+                labels["outcome"] = "ok"
+                return res
+            labels["outcome"] = "throttled"
+        print(f"Solapi throttled ({res.status_code}), retrying in {delay:.2f}s")
+        solapi_bucket.pause(delay)
+        attempt += 1
+
+async def _post_async(path: str, body: dict, endpoint: str):
+    attempt = 0
+    while True:
+        await solapi_bucket.acquire_async()
+        with SOLAPI_REQUEST_DURATION.time(endpoint=endpoint, outcome="error") as labels:
+            res = await (await get_async_client()).post(path, json=body, headers=get_headers())
+            delay = _retry_delay(res, attempt)
+            if delay is None:
+                res.raise_for_status()
+                labels["outcome"] = "ok"
+                return res
+            labels["outcome"] = "throttled"
+        print(f"Solapi throttled ({res.status_code}), retrying in {delay:.2f}s")
+        solapi_bucket.pause(delay)
+        attempt += 1
+
+# 6. 문자 발송 함수
+def send_sms(to_number: str, text: str, subject: str = None):
+    # API 키가 없는 경우 (로컬 테스트 중 실수 방지)
+    if not SOLAPI_API_KEY or not SOLAPI_SECRET_KEY:
+        print(f"[MOCK SEND] To: {to_number}, Subject: {subject}, Content: {text}")
+        return {"status": "mock_success", "messageId": "mock_id"}
+
+    import requests
+
     payload = {
-        "message": message_payload
+        "message": build_message(to_number, text, subject)
     }
 
     try:
-        # 헤더를 매 요청마다 새로 생성해야 함 (시간 정보 때문)
-        res = requests.post(url, json=payload, headers=get_headers())
-        res.raise_for_status() # 200 OK가 아니면 에러 발생시킴
+        res = _post("/messages/v4/send", payload, "send")
         
         # 성공 시 결과 반환
         return res.json()
         
     except requests.exceptions.HTTPError as err:
         print(f"HTTP Error: {err}")
-        print(f"Response Body: {res.text}") # 에러 원인(API 응답) 출력
-        return {"status": "error", "error": str(err), "detail": res.text}
+        print(f"Response Body: {err.response.text}") # 에러 원인(API 응답) 출력
+        return {"status": "error", "error": str(err), "detail": err.response.text,
+                "rejected": _rejected_status(err.response.status_code)}
         
     except Exception as e:
         print(f"Failed to send SMS: {e}")
-        return {"status": "error", "error": str(e)}
\ No newline at end of file
+        return {"status": "error", "error": str(e), "rejected": False}
+
+# 7. 대량 발송 함수 (Solapi send-many)
+# 한 번의 요청에 최대 10,000건까지 가능 (Solapi 제한)
+SOLAPI_BATCH_LIMIT = 10000
+SOLAPI_BATCH_SIZE = min(int(os.environ.get("SOLAPI_BATCH_SIZE", "1000")), SOLAPI_BATCH_LIMIT)
+
+def send_sms_batch(messages: list):
+    """
+    여러 건을 Solapi send-many API 로 묶어서 발송한다.
+    messages: [{"to": ..., "text": ..., "subject": ...}, ...]
+    반환값: messages 와 같은 순서의 발송 결과 리스트 (send_sms 결과와 같은 형식)
+    """
+    if not messages:
+        return []
+
+    if not SOLAPI_API_KEY or not SOLAPI_SECRET_KEY:
+        results = []
+        for m in messages:
+            print(f"[MOCK SEND] To: {m['to']}, Subject: {m.get('subject')}, Content: {m['text']}")
+            results.append({"status": "mock_success", "messageId": "mock_id"})
+        return results
+
+    results = []
+    for start in range(0, len(messages), SOLAPI_BATCH_SIZE):
+        results.extend(_send_many(messages[start:start + SOLAPI_BATCH_SIZE]))
+    return results
+
+def _build_batch_payload(chunk: list):
+    payload_messages = []
+    for idx, m in enumerate(chunk):
+        message_payload = build_message(m['to'], m['text'], m.get('subject'))
+        # 결과를 요청 순서에 다시 매핑하기 위한 식별자
+        message_payload["customFields"] = {"batchIndex": str(idx)}
+        payload_messages.append(message_payload)
+    return payload_messages
+
+def _map_batch_results(payload_messages: list, body: dict):
+    group_id = (body.get("groupInfo") or {}).get("groupId")
+    results = [None] * len(payload_messages)
+
+    def find_index(item):
+        batch_index = (item.get("customFields") or {}).get("batchIndex")
+        if batch_index is not None and results[int(batch_index)] is None:
+            return int(batch_index)
+        # customFields 가 없으면 수신번호로 아직 매핑되지 않은 첫 요청에 매핑
+        for i, p in enumerate(payload_messages):
+            if results[i] is None and p["to"] == item.get("to"):
+                return i
+        return None
+
+    for item in body.get("failedMessageList") or []:
+        idx = find_index(item)
+        if idx is not None:
+            results[idx] = {
+                "status": "error",
+                "error": item.get("statusMessage") or item.get("statusCode") or "failed",
+                "detail": item,
+                "rejected": True
+            }
+
+    for item in body.get("messageList") or []:
+        idx = find_index(item)
+        if idx is not None:
+            results[idx] = {**item, "groupId": group_id}
+
+    # 응답에 결과가 없는 메시지는 그룹 접수 성공으로 간주
+    return [r if r is not None else {"status": "accepted", "groupId": group_id} for r in results]
+
+def _send_many(chunk: list):
+    import requests
+
+    payload_messages = _build_batch_payload(chunk)
+
+    try:
+        body = _post("/messages/v4/send-many/detail", {"messages": payload_messages}, "send-many").json()
+    except requests.exceptions.HTTPError as err:
+        print(f"HTTP Error: {err}")
+        print(f"Response Body: {err.response.text}")
+        rejected = _rejected_status(err.response.status_code)
+        return [{"status": "error", "error": str(err), "detail": err.response.text, "rejected": rejected} for _ in chunk]
+    except Exception as e:
+        print(f"Failed to send SMS batch: {e}")
+        return [{"status": "error", "error": str(e), "rejected": False} for _ in chunk]
+
+    return _map_batch_results(payload_messages, body)
+
+# 8. 비동기 클라이언트 (첫 발송 시 생성, 앱 lifespan 종료 시 닫음, keep-alive 커넥션 재사용)
+# 스크립트(check_connect.py 등)에서는 위의 동기 함수들을 그대로 사용
+_async_client: "httpx.AsyncClient" = None
+# cold start 에 동시에 들어온 첫 요청들이 클라이언트를 각자 만들지 않도록 잠금
+_async_client_lock = asyncio.Lock()
+
+def create_async_client() -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(
+        base_url=SOLAPI_BASE_URL,
+        timeout=httpx.Timeout(SOLAPI_READ_TIMEOUT, connect=SOLAPI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=SOLAPI_MAX_CONNECTIONS,
+            max_keepalive_connections=SOLAPI_MAX_CONNECTIONS
+        )
+    )
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+async def get_async_client() -> "httpx.AsyncClient":
+    # 첫 발송에서 지연 생성 (import / 앱 시작 시점에는 만들지 않음)
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+    async with _async_client_lock:
+        if _async_client is None:
+            _async_client = create_async_client()
+    return _async_client
+
+async def send_sms_async(to_number: str, text: str, subject: str = None):
+    if not SOLAPI_API_KEY or not SOLAPI_SECRET_KEY:
+        print(f"[MOCK SEND] To: {to_number}, Subject: {subject}, Content: {text}")
+        return {"status": "mock_success", "messageId": "mock_id"}
+
+    import httpx
+
+    payload = {
+        "message": build_message(to_number, text, subject)
+    }
+
+    try:
+        res = await _post_async("/messages/v4/send", payload, "send")
+        return res.json()
+
+    except httpx.HTTPStatusError as err:
+        print(f"HTTP Error: {err}")
+        print(f"Response Body: {err.response.text}")
+        return {"status": "error", "error": str(err), "detail": err.response.text,
+                "rejected": _rejected_status(err.response.status_code)}
+
+    except Exception as e:
+        print(f"Failed to send SMS: {e}")
+        return {"status": "error", "error": str(e), "rejected": False}
+
+async def send_sms_batch_async(messages: list):
+    """
+    send_sms_batch 의 비동기 버전. 청크들은 커넥션 풀 / 호출 속도 제한 안에서 동시에 전송된다.
+    """
+    if not messages:
+        return []
+
+    if not SOLAPI_API_KEY or not SOLAPI_SECRET_KEY:
+        return send_sms_batch(messages)
+
+    chunks = [messages[start:start + SOLAPI_BATCH_SIZE] for start in range(0, len(messages), SOLAPI_BATCH_SIZE)]
+    chunk_results = await asyncio.gather(*(_send_many_async(chunk) for chunk in chunks))
+    return [r for results in chunk_results for r in results]
+
+async def _send_many_async(chunk: list):
+    import httpx
+
+    payload_messages = _build_batch_payload(chunk)
+
+    try:
+        res = await _post_async("/messages/v4/send-many/detail", {"messages": payload_messages}, "send-many")
+        body = res.json()
+    except httpx.HTTPStatusError as err:
+        print(f"HTTP Error: {err}")
+        print(f"Response Body: {err.response.text}")
+        rejected = _rejected_status(err.response.status_code)
+        return [{"status": "error", "error": str(err), "detail": err.response.text, "rejected": rejected} for _ in chunk]
+    except Exception as e:
+        print(f"Failed to send SMS batch: {e}")
+        return [{"status": "error", "error": str(e), "rejected": False} for _ in chunk]
+
+    return _map_batch_results(payload_messages, body)
@@ -0,0 +1,112 @@
+import json
+import base64
+
+# sms_logs 유틸
+# - 틱(cron) 하나에서 발생한 로그를 모아서 한 번(또는 청크 단위)의 bulk insert 로 기록
+# - 로그 목록 keyset 페이지 조회
+
+# sms_logs 의 unique (reservation_id, trigger_type, sent_date) 제약조건으로 중복 무시
+LOG_INSERT_CHUNK_SIZE = 500
+
+def _log_key(row):
+    return (int(row['reservation_id']), row['trigger_type'], str(row['sent_date']))
+
+async def insert_logs(storage, rows, chunk_size=LOG_INSERT_CHUNK_SIZE):
+    """
+    로그 행들을 bulk insert 한다. (이미 같은 날 기록된 조합은 on_conflict 로 무시)
+    반환값: rows 와 같은 순서의 상태 리스트
+      - 'inserted'  : 새로 기록됨
+      - 'duplicate' : 같은 (예약, 트리거, 날짜) 로그가 이미 있음
+      - 'failed'    : 기록 실패
+    """
+    statuses = [None] * len(rows)
+
+    # 같은 배치 안의 중복은 첫 행만 기록
+    first_index = {}
+    pending = []
+    for idx, row in enumerate(rows):
+        key = _log_key(row)
+        if key in first_index:
+            statuses[idx] = 'duplicate'
+        else:
+            first_index[key] = idx
+            pending.append(idx)
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            inserted_rows = await storage.insert_logs([rows[idx] for idx in chunk])
+        except Exception as e:
+            # 청크 전체가 실패하면 어느 행이 문제인지 알 수 있도록 한 건씩 재시도
+            print(f"Error inserting log chunk ({len(chunk)} rows): {e}")
+            for idx in chunk:
+                statuses[idx] = await _insert_one(storage, rows[idx])
+            continue
+
+        inserted = {_log_key(r) for r in inserted_rows}
+        for idx in chunk:
+            statuses[idx] = 'inserted' if _log_key(rows[idx]) in inserted else 'duplicate'
+
+    return statuses
+
+async def _insert_one(storage, row):
+    try:
+        return 'inserted' if await storage.insert_logs([row]) else 'duplicate'
+    except Exception as e:
+        print(f"Error inserting log (reservation_id={row.get('reservation_id')}, trigger={row.get('trigger_type')}): {e}")
+        return 'failed'
+
+async def logged_keys(storage, sent_date, trigger_types):
+    """
+    sent_date 에 이미 기록된 (reservation_id, trigger_type) 집합 (trigger_types 에 해당하는 것만)
+    cron 틱에서 발송 전에 한 번 조회해서 중복 조합을 메모리에서 걸러냄
+    """
+    return await storage.logged_keys(sent_date, set(trigger_types))
+
+# 로그 목록 조회 (keyset 페이지네이션: sent_at DESC, id DESC)
+LOG_PAGE_MAX = 200
+
+def encode_cursor(row):
+    raw = json.dumps([row['sent_at'], row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """
+    반환값: (sent_at, id). 형식이 잘못되면 ValueError
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sent_at, log_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return str(sent_at), int(log_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+async def fetch_log_page(storage, limit=50, cursor=None, date_from=None, date_to=None,
+                   status=None, trigger_type=None, accommodation=None):
+    """
+    로그 한 페이지를 예약 정보와 함께 (embedded select, 1회 요청) 조회.
+    - date_from / date_to: 발송일(sent_date, KST) 범위 (YYYY-MM-DD, 포함)
+    - trigger_type: 접두어 일치 (예: 'checkin', 'manual_')
+    - accommodation: 예약 숙소 이름 (inner join 으로 필터)
+    반환값: (로그 리스트, 다음 페이지 cursor 또는 None)
+    """
+    limit = max(1, min(limit, LOG_PAGE_MAX))
+    after = decode_cursor(cursor) if cursor else None
+
+    # 다음 페이지 존재 여부 확인을 위해 1건 더 조회
+    rows = await storage.log_page(
+        limit + 1, after=after, date_from=date_from, date_to=date_to,
+        status=status, trigger_prefix=trigger_type, accommodation=accommodation
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+    logs = []
+    for row in rows[:limit]:
+        res_info = row.pop("reservations", None) or {}
+        logs.append({
+            **row,
+            "guest_name": res_info.get("guest_name", "Unknown"),
+            "accommodation_name": res_info.get("accommodation_name", "-"),
+            "phone_number": res_info.get("phone_number", "-")
+        })
+    return logs, next_cursor
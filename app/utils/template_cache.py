@@ -0,0 +1,57 @@
+import os
+import time
+import asyncio
+
+# 프로세스 단위 message_templates 캐시
+# - TTL 동안은 DB 조회 없이 캐시 사용
+# - TTL 만료 시 테이블 변경 횟수(버전)만 가볍게 확인하고, 바뀐 경우에만 전체 재조회
+# - PUT /templates/{id} 에서 invalidate() 로 즉시 무효화 (다른 인스턴스는 버전 확인으로 반영)
+
+TEMPLATE_CACHE_TTL = float(os.environ.get("TEMPLATE_CACHE_TTL", "60"))
+
+_lock = asyncio.Lock()
+_templates = None
+_version = None
+_checked_at = 0.0
+
+async def _fetch_version(storage):
+    return await storage.table_version("message_templates")
+
+async def get_templates(storage):
+    """
+    전체 템플릿 목록 (캐시). 반환된 리스트/딕셔너리는 수정하지 말 것.
+    """
+    global _templates, _version, _checked_at
+
+    # TTL 안에서는 잠금/조회 없이 바로 반환
+    if _templates is not None and time.monotonic() - _checked_at < TEMPLATE_CACHE_TTL:
+        return _templates
+
+    # 동시에 만료된 요청들이 같은 조회를 중복하지 않도록 잠금
+    async with _lock:
+        now = time.monotonic()
+        if _templates is not None and now - _checked_at < TEMPLATE_CACHE_TTL:
+            return _templates
+
+        if _templates is not None:
+            version = await _fetch_version(storage)
+            if version == _version:
+                _checked_at = now
+                return _templates
+        else:
+            version = None
+
+        # 캐시가 비었거나 버전이 바뀜 -> 전체 재조회
+        # (버전을 먼저 읽어야 재조회 도중 변경된 내용이 다음 확인에서 반영됨)
+        if version is None:
+            version = await _fetch_version(storage)
+        _templates = await storage.list_templates()
+        _version = version
+        _checked_at = now
+        return _templates
+
+def invalidate():
+    global _templates, _version, _checked_at
+    _templates = None
+    _version = None
+    _checked_at = 0.0
@@ -0,0 +1,303 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+
+# 벤치마크는 메모리 SQLite 저장소만 사용 (Supabase 설정 불필요)
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+
+from app.config import KST
+from app.storage.sqlite_store import SQLiteStorage
+from app.api import cron
+from app.utils import outbox, template_cache
+from app.utils.sharding import ShardSpec, SHARD_KEYS, combine_reports
+
+# cron 발송 처리 마이크로 벤치마크 (Supabase / Solapi 없이 실행)
+# - seed.py 의 숙소/템플릿 패턴을 확장한 합성 데이터를 메모리 SQLite 저장소에 생성
+# - 틱 처리 단계별(템플릿 조회, 대상 선정, 렌더링, 발송, 로그 기록) 소요 시간을 반복 측정
+# - 발송(send_sms_batch_async)은 즉시 성공을 돌려주는 mock 으로 교체
+# - 결과는 JSON 으로 출력 (버전 간 비교용)
+# - --shards n 이면 같은 틱을 n 개 샤드로 나눠 차례로 실행 (tick_shard: 샤드 1개 처리 시간, 합친 결과는 sharded)
+#
+# 예) python bench_cron.py --reservations 100000 --templates 300 --output bench_output.txt
+
+# seed.py 와 같은 숙소 이름 (그 이상은 합성 이름)
+BASE_ROOMS = ["초원고택1", "초원고택2", "초원고택3", "초원별장(시네)", "초원별장(정글)", "초원브릿지"]
+
+COMMON_TEMPLATES = [
+    ("checkin_food_0900", "맛집 안내", "{name}님, 입실 전 주변 맛집을 소개해드립니다..."),
+    ("checkin_1900", "저녁 안내", "{name}님, 저녁 식사는 맛있게 하셨나요?..."),
+    ("checkout_0900", "퇴실 안내", "{name}님, 편안한 밤 되셨나요? 11시 퇴실입니다..."),
+    ("checkout_1700", "리뷰 요청", "{name}님, 이용해주셔서 감사합니다. 리뷰 부탁드려요..."),
+    ("multinight_0900", "연박 안내", "{name}님, 연박 안내드립니다..."),
+]
+
+SPECIFIC_CATEGORIES = ["checkin", "checkout", "multinight"]
+
+def room_names(count):
+    return [BASE_ROOMS[i] if i < len(BASE_ROOMS) else f"합성숙소{i:05d}" for i in range(count)]
+
+def build_templates(rooms, count, send_times, rng):
+    """
+    공통메세지 템플릿 + 숙소별 템플릿 (총 count 개)
+    send_time 은 09:00 부터 send_times 개의 분에 나눠 배정 (1 이면 모두 09:00 - 최악의 경우)
+    """
+    base = datetime(2000, 1, 1, 9, 0)
+    times = [(base + timedelta(minutes=i)).strftime("%H:%M:%S") for i in range(send_times)]
+
+    rows = []
+    for trigger_type, subject, content in COMMON_TEMPLATES[:count]:
+        rows.append({
+            "accommodation_name": outbox.COMMON_ACCOMMODATION,
+            "trigger_type": trigger_type,
+            "send_time": rng.choice(times),
+            "subject": subject,
+            "content": content
+        })
+
+    for i in range(count - len(rows)):
+        room = rooms[i % len(rooms)]
+        category = SPECIFIC_CATEGORIES[i % len(SPECIFIC_CATEGORIES)]
+        rows.append({
+            "accommodation_name": room,
+            "trigger_type": f"{category}_{i:05d}",
+            "send_time": rng.choice(times),
+            "subject": f"{room} 안내",
+            "content": f"{{name}}님, {{accommodation}} 안내입니다. 입실 {{checkin_date}}, 퇴실 {{checkout_date}}\n\n[{room} 기본안내]"
+        })
+    return rows
+
+def build_reservations(rooms, count, tick_date, rng):
+    """
+    숙소별로 겹치지 않는 연속 예약 (1~4박, 0~2일 간격), tick_date 가 각 숙소 예약 기간 중간에 오도록 배치
+    """
+    per_room = -(-count // len(rooms))
+    rows = []
+    for room in rooms:
+        day = tick_date - timedelta(days=per_room * 2 + rng.randint(0, 3))
+        for _ in range(per_room):
+            if len(rows) >= count:
+                break
+            nights = rng.randint(1, 4)
+            rows.append({
+                "guest_name": f"게스트{len(rows):06d}",
+                "phone_number": f"010{len(rows):08d}",
+                "accommodation_name": room,
+                "checkin_date": str(day),
+                "checkout_date": str(day + timedelta(days=nights)),
+                "memo": None
+            })
+            day += timedelta(days=nights + rng.randint(0, 2))
+    return rows
+
+class PhaseTimer:
+    def __init__(self):
+        self.samples = {}
+        self.items = {}
+
+    def add(self, name, seconds, items=None):
+        self.samples.setdefault(name, []).append(seconds)
+        if items is not None:
+            self.items[name] = items
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - start)
+
+    def results(self):
+        out = {}
+        for name, samples in self.samples.items():
+            ms = [s * 1000 for s in samples]
+            out[name] = {
+                "runs": len(ms),
+                "min_ms": round(min(ms), 3),
+                "median_ms": round(statistics.median(ms), 3),
+                "mean_ms": round(statistics.fmean(ms), 3),
+                "max_ms": round(max(ms), 3),
+                "items": self.items.get(name)
+            }
+        return out
+
+def install_mocks(timer):
+    """
+    cron 모듈의 발송/로그 함수를 교체해서 dispatch_messages 안의 단계별 시간을 따로 측정
+    """
+    insert_logs = cron.insert_logs
+
+    async def mock_send(messages):
+        start = time.perf_counter()
+        results = [{"status": "accepted"} for _ in messages]
+        timer.add("send_mock", time.perf_counter() - start, len(messages))
+        return results
+
+    async def timed_insert_logs(storage, rows):
+        start = time.perf_counter()
+        statuses = await insert_logs(storage, rows)
+        timer.add("log_write", time.perf_counter() - start, len(rows))
+        return statuses
+
+    cron.send_sms_batch_async = mock_send
+    cron.insert_logs = timed_insert_logs
+
+async def setup(args):
+    rng = random.Random(args.seed)
+    storage = SQLiteStorage(":memory:")
+    tick_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+
+    rooms = room_names(args.accommodations or max(len(BASE_ROOMS), -(-args.reservations // args.stays_per_accommodation)))
+    templates = build_templates(rooms, args.templates, args.send_times, rng)
+    reservations = build_reservations(rooms, args.reservations, tick_date, rng)
+
+    await storage.insert_templates(templates)
+    for start in range(0, len(reservations), 1000):
+        await storage.insert_reservations(reservations[start:start + 1000])
+    return storage, tick_date, len(rooms)
+
+async def run(args):
+    started = time.perf_counter()
+    storage, tick_date, room_count = await setup(args)
+    setup_seconds = time.perf_counter() - started
+
+    timer = PhaseTimer()
+    install_mocks(timer)
+    now_kst = datetime.combine(tick_date, datetime.strptime(args.time, "%H:%M").time(), tzinfo=KST)
+    current_time_str = now_kst.strftime("%H:%M")
+
+    # cron 이 단계마다 출력하는 로그는 측정에서 제외 (버퍼로 버림)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # outbox 전체 재계산은 무거우므로 1회만 측정 (이후 반복에서 조회 대상은 변하지 않음)
+        with timer.phase("outbox_rebuild"):
+            scheduled = await outbox.rebuild(
+                storage, await template_cache.get_templates(storage), now_kst - timedelta(minutes=1))
+        timer.items["outbox_rebuild"] = scheduled
+
+        for _ in range(args.repeat):
+            template_cache.invalidate()
+            with timer.phase("templates_cold"):
+                all_templates = await template_cache.get_templates(storage)
+            with timer.phase("templates_warm"):
+                all_templates = await template_cache.get_templates(storage)
+
+            # 1단계 (수동 시각 경로): 해당 분 템플릿 + 후보 예약 조회 + 조합
+            with timer.phase("select_candidates"):
+                templates = cron.due_templates(all_templates, current_time_str)
+                candidates = await cron.fetch_candidate_reservations(storage, templates, tick_date)
+                pairs = outbox.match_pairs(candidates, templates, tick_date)
+            timer.items["select_candidates"] = len(pairs)
+
+            # 1단계 (outbox 경로): 틱 구간의 발송 예정 메시지 조회
+            with timer.phase("outbox_fetch_due"):
+                due_rows = await outbox.fetch_due(storage, now_kst - timedelta(minutes=1), now_kst)
+                outbox_pairs, _ = cron.outbox_pairs(due_rows, all_templates)
+            timer.items["outbox_fetch_due"] = len(outbox_pairs)
+
+            # 2단계: 렌더링
+            with timer.phase("render"):
+                messages, render_failed = cron.render_messages(pairs)
+            timer.items["render"] = len(messages)
+
+            # 3단계: 발송 + 로그 기록 (매 반복마다 로그를 비워 같은 양을 새로 기록)
+            storage.conn.execute("delete from sms_logs")
+            storage.conn.commit()
+            with timer.phase("dispatch"):
+                await cron.dispatch_messages(storage, messages, now_kst)
+            timer.items["dispatch"] = len(messages)
+
+            # 전체 틱 (수동 시각 경로, 엔드포인트와 같은 run_tick)
+            storage.conn.execute("delete from sms_logs")
+            storage.conn.commit()
+            with timer.phase("tick_total"):
+                response = await cron.run_tick(args.time, args.date, storage)
+            timer.items["tick_total"] = response["processed"]
+            # 틱 응답의 단계별 시간 (timings_ms)
+            for name, ms in response["timings_ms"].items():
+                timer.add(f"tick.{name}", ms / 1000)
+
+            # 샤드별 틱 (같은 대상을 나눠 처리 - 합친 처리 건수가 전체 틱과 같아야 함)
+            if args.shards > 1:
+                storage.conn.execute("delete from sms_logs")
+                storage.conn.commit()
+                reports = []
+                for index in range(args.shards):
+                    with timer.phase("tick_shard"):
+                        reports.append(await cron.run_tick(
+                            args.time, args.date, storage, ShardSpec(index, args.shards, args.shard_by)))
+                sharded = combine_reports(reports)
+                sharded.pop("log_failed")
+                sharded["per_shard_processed"] = [r["processed"] for r in reports]
+                sharded["unsharded_processed"] = response["processed"]
+                timer.items["tick_shard"] = sharded["processed"]
+
+    await storage.close()
+    result = {
+        "benchmark": "cron_dispatch",
+        "created_at": datetime.now(KST).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "reservations": args.reservations,
+            "templates": args.templates,
+            "accommodations": room_count,
+            "send_times": args.send_times,
+            "date": args.date,
+            "time": args.time,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "shards": args.shards,
+            "shard_by": args.shard_by
+        },
+        "setup_seconds": round(setup_seconds, 3),
+        "phases": timer.results()
+    }
+    if args.shards > 1:
+        # 마지막 반복의 샤드별 결과를 합친 보고서
+        result["sharded"] = sharded
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="cron 발송 처리 단계별 벤치마크 (합성 데이터, 메모리 SQLite)")
+    parser.add_argument("--reservations", type=int, default=10000)
+    parser.add_argument("--templates", type=int, default=100)
+    parser.add_argument("--accommodations", type=int, default=None,
+                        help="숙소 수 (기본: 예약 수 / stays-per-accommodation)")
+    parser.add_argument("--stays-per-accommodation", type=int, default=20)
+    parser.add_argument("--send-times", type=int, default=1,
+                        help="템플릿 발송 시각을 나눌 분 수 (1 이면 모든 템플릿이 측정 틱에 해당)")
+    parser.add_argument("--date", default="2026-02-10", help="측정 틱 날짜 (YYYY-MM-DD)")
+    parser.add_argument("--time", default="09:00", help="측정 틱 시각 (HH:MM)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shards", type=int, default=1, help="틱을 나눌 샤드 수 (1 이면 분할 측정 안 함)")
+    parser.add_argument("--shard-by", default="reservation", choices=SHARD_KEYS)
+    parser.add_argument("--output", help="결과 JSON 파일 경로 (기본: 표준 출력)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import re
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+# Vercel 진입점(api/index.py) import 시간 벤치마크 (cold start 비용 추적용)
+# - 매 반복마다 새 파이썬 프로세스에서 "import api.index" 소요 시간을 측정 (모듈 캐시 없는 상태)
+# - python -X importtime 결과로 모듈별 누적 import 시간 상위 목록도 함께 기록
+# - 결과는 bench_cron.py 와 같은 형식의 JSON 으로 출력 (버전 간 비교용)
+#
+# 예) python bench_import.py --repeat 10 --output bench_import_output.txt
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 측정 대상 프로세스: import 경과 시간(초)을 마지막 줄에 출력
+# (모듈이 import 중에 출력하는 경고 등은 앞줄에 섞여도 무시)
+PROBE = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+# -X importtime 출력 형식: "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def run_once(module, env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    seconds = float(proc.stdout.strip().splitlines()[-1])
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = {
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                # 들여쓰기 깊이 (0 이면 최상위 import - 측정 모듈, 인터프리터 시작 시의 site 등)
+                "depth": (len(indent) - 1) // 2
+            }
+    return seconds, modules
+
+def summarize_modules(runs, top):
+    """
+    반복 측정 결과의 모듈별 중앙값 (누적 시간 기준 상위 top 개, 자체 시간 기준 상위 top 개)
+    """
+    names = set().union(*(modules.keys() for modules in runs))
+    rows = []
+    for name in names:
+        samples = [modules[name] for modules in runs if name in modules]
+        rows.append({
+            "module": name,
+            "depth": samples[0]["depth"],
+            "cumulative_ms": round(statistics.median(s["cumulative_us"] for s in samples) / 1000, 3),
+            "self_ms": round(statistics.median(s["self_us"] for s in samples) / 1000, 3)
+        })
+    by_cumulative = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+    by_self = sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:top]
+    return by_cumulative, by_self, len(names)
+
+def run(args):
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+
+    # 첫 실행은 .pyc 생성 등으로 느리므로 측정에서 제외
+    run_once(args.module, env)
+
+    seconds = []
+    module_runs = []
+    for _ in range(args.repeat):
+        elapsed, modules = run_once(args.module, env)
+        seconds.append(elapsed)
+        module_runs.append(modules)
+
+    ms = [s * 1000 for s in seconds]
+    by_cumulative, by_self, module_count = summarize_modules(module_runs, args.top)
+    return {
+        "benchmark": "import_time",
+        "created_at": datetime.now().astimezone().isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "module": args.module,
+            "repeat": args.repeat,
+            "top": args.top,
+            "storage_backend": env["STORAGE_BACKEND"]
+        },
+        "import": {
+            "runs": len(ms),
+            "min_ms": round(min(ms), 3),
+            "median_ms": round(statistics.median(ms), 3),
+            "mean_ms": round(statistics.fmean(ms), 3),
+            "max_ms": round(max(ms), 3),
+            "modules": module_count
+        },
+        "top_cumulative": by_cumulative,
+        "top_self": by_self
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Vercel 진입점 import 시간 벤치마크 (새 프로세스에서 반복 측정)")
+    parser.add_argument("--module", default="api.index", help="측정할 모듈 (기본: api.index)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=20, help="모듈별 상위 목록 개수")
+    parser.add_argument("--output", help="결과 JSON 파일 경로 (기본: 표준 출력)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import os
+import sys
+import asyncio
+from app.storage.supabase_store import SupabaseStorage
+from dotenv import load_dotenv
+from app.utils import outbox
+
+load_dotenv()
+
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_KEY")
+
+if not url or not key:
+    print("Error: SUPABASE_URL or SUPABASE_KEY not found.")
+    sys.exit(1)
+
+# 발송 예정 메시지(scheduled_messages) 전체 재계산
+# - scheduled_messages 테이블을 처음 만든 뒤 1회 실행
+# - 템플릿을 스크립트로 직접 수정한 경우 (seed.py, update_template_time.py 등) 실행
+
+async def rebuild_outbox():
+    print("Rebuilding scheduled_messages...")
+    storage = await SupabaseStorage.create(url, key)
+    try:
+        templates = await storage.list_templates()
+        count = await outbox.rebuild(storage, templates)
+        print(f"Scheduled {count} messages.")
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        await storage.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_outbox())
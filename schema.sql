@@ -1,4 +1,11 @@
+-- 숙소별 예약 기간 겹침 방지 제약조건(exclusion)에 필요
+create extension if not exists btree_gist;
+
 -- [Reset] 기존 테이블 삭제 (순서 중요: 의존성 역순)
+drop table if exists table_changes;
+drop table if exists cron_state;
+drop table if exists sms_retry_queue;
+drop table if exists scheduled_messages;
 drop table if exists sms_logs;
 drop table if exists message_templates;
 drop table if exists reservations;
@@ -24,13 +31,28 @@ create table message_templates (
   accommodation_name text references accommodations(name) on delete cascade not null,
   trigger_type text not null, 
   send_time time not null,
+  subject text,
   content text not null,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  -- 템플릿 캐시 버전 확인용 (수정 시 갱신)
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
   
   -- [중요] Upsert 처리를 위한 유니크 제약조건
   unique (accommodation_name, trigger_type)
 );
 
+-- 템플릿 수정 시 updated_at 자동 갱신 (스크립트에서 직접 수정해도 캐시 버전이 바뀌도록)
+create or replace function touch_updated_at() returns trigger as $$
+begin
+  new.updated_at = timezone('utc'::text, now());
+  return new;
+end;
+$$ language plpgsql;
+
+create trigger message_templates_touch_updated_at
+  before update on message_templates
+  for each row execute function touch_updated_at();
+
 -- [3] 예약 정보 테이블
 create table reservations (
   id bigint generated by default as identity primary key,
@@ -40,9 +62,22 @@ create table reservations (
   checkin_date date not null,
   checkout_date date not null,
   memo text,
-  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  -- 조건부 GET(ETag) 변경 표시용 (수정 시 갱신)
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
+
+  -- [중요] 같은 숙소의 [입실일, 퇴실일) 기간은 겹칠 수 없음 (당일 퇴실/입실은 허용)
+  exclude using gist (accommodation_name with =, daterange(checkin_date, checkout_date, '[)') with &&)
 );
 
+create trigger reservations_touch_updated_at
+  before update on reservations
+  for each row execute function touch_updated_at();
+
+-- cron 대상 조회용 인덱스 (입실일/퇴실일 당일, 연박 범위 조회)
+create index reservations_checkin_date_idx on reservations (checkin_date);
+create index reservations_checkout_date_idx on reservations (checkout_date);
+
 -- [4] 문자 발송 이력 테이블 (중복 방지용)
 create table sms_logs (
   id bigint generated by default as identity primary key,
@@ -53,7 +88,118 @@ create table sms_logs (
   -- [변경] sent_at::date 캐스팅 인덱스 대신 별도 컬럼 사용 (가장 확실한 방법)
   sent_date date not null default current_date,                         
   status text default 'success',
+  -- 발송 시도 횟수 (최초 발송 포함, 재시도 큐에서 다시 보낼 때마다 증가)
+  attempts integer not null default 1,
+  -- 마지막 재발송 시각 (sent_at 은 최초 발송 시각 그대로 유지)
+  retried_at timestamp with time zone,
+  -- 조건부 GET(ETag) 변경 표시용 (재발송 결과 반영 등 수정 시 갱신)
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
   
   -- [중요] "예약ID + 트리거 + 날짜" 조합은 유일해야 함 (중복 발송 원천 차단)
   unique (reservation_id, trigger_type, sent_date)
 );
+
+-- 발송 내역 페이지 조회용 (sent_at, id) keyset 인덱스
+create index sms_logs_sent_at_id_idx on sms_logs (sent_at desc, id desc);
+-- cron 발송 전 중복 확인용 (해당 날짜의 trigger_type 별 기록 조회)
+create index sms_logs_sent_date_trigger_idx on sms_logs (sent_date, trigger_type);
+
+create trigger sms_logs_touch_updated_at
+  before update on sms_logs
+  for each row execute function touch_updated_at();
+
+-- [5] 발송 예정 메시지 outbox (예약/템플릿 변경 시 미리 계산, cron 은 send_at 범위 조회만 수행)
+create table scheduled_messages (
+  id bigint generated by default as identity primary key,
+  reservation_id bigint references reservations(id) on delete cascade not null,
+  template_id bigint references message_templates(id) on delete cascade not null,
+  trigger_type text not null,
+  send_at timestamp with time zone not null,
+  sent_at timestamp with time zone,
+  -- 발송 중인 cron 틱의 선점 만료 시각 (겹쳐 실행된 다른 틱이 같은 행을 보내지 않도록)
+  claimed_until timestamp with time zone,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+
+  unique (reservation_id, trigger_type, send_at)
+);
+
+-- 미발송 건 발송 시각 범위 조회용 부분 인덱스
+create index scheduled_messages_due_idx on scheduled_messages (send_at) where sent_at is null;
+create index scheduled_messages_template_idx on scheduled_messages (template_id) where sent_at is null;
+
+-- [6] cron 처리 상태 (워터마크: 마지막으로 처리 완료한 구간의 끝 시각)
+create table cron_state (
+  name text primary key,
+  watermark timestamp with time zone
+);
+
+-- [7] 발송 실패 메시지 재시도 큐 (cron 틱과 별도로 /api/cron/retry 가 지수 백오프로 재발송)
+-- 발송 결과는 같은 (reservation_id, trigger_type, sent_date) 의 sms_logs 행에 반영
+create table sms_retry_queue (
+  id bigint generated by default as identity primary key,
+  reservation_id bigint references reservations(id) on delete cascade not null,
+  trigger_type text not null,
+  sent_date date not null,
+  phone_number text not null,
+  content text not null,
+  subject text,
+  attempts integer not null default 1,
+  next_attempt_at timestamp with time zone not null,
+  last_error text,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+
+  unique (reservation_id, trigger_type, sent_date)
+);
+
+-- 재시도 시각 도래 건 조회용
+create index sms_retry_queue_next_attempt_idx on sms_retry_queue (next_attempt_at);
+
+-- [8] 테이블별 변경 횟수 (변경 표시값 table_version 용)
+-- 추가/수정/삭제 문장마다 트리거가 1씩 증가 (항상 증가만 하므로, 늦게 커밋된 트랜잭션도 반드시 새 값으로 보임)
+-- (건수는 전체 스캔, now() 기반 updated_at 최댓값은 트랜잭션 시작 시각이라 늦게 커밋된 변경을 놓칠 수 있음)
+create table table_changes (
+  name text primary key,
+  changes bigint not null default 0
+);
+
+create or replace function count_table_changes() returns trigger as $$
+begin
+  insert into table_changes (name, changes) values (tg_table_name, 1)
+  on conflict (name) do update set changes = table_changes.changes + 1;
+  return null;
+end;
+$$ language plpgsql;
+
+create trigger message_templates_count_changes
+  after insert or update or delete on message_templates
+  for each statement execute function count_table_changes();
+create trigger reservations_count_changes
+  after insert or update or delete on reservations
+  for each statement execute function count_table_changes();
+create trigger sms_logs_count_changes
+  after insert or update or delete on sms_logs
+  for each statement execute function count_table_changes();
+
+-- [마이그레이션] 기존 DB 에 적용할 변경사항 (reset 없이 실행)
+-- alter table message_templates add column if not exists subject text;
+-- alter table message_templates add column if not exists updated_at timestamp with time zone default timezone('utc'::text, now()) not null;
+-- (위 touch_updated_at 함수/트리거도 함께 생성)
+-- create index if not exists reservations_checkin_date_idx on reservations (checkin_date);
+-- create index if not exists reservations_checkout_date_idx on reservations (checkout_date);
+-- scheduled_messages 테이블/인덱스 생성 후 rebuild_outbox.py 실행
+-- cron_state 테이블 생성
+-- alter table reservations add column if not exists updated_at timestamp with time zone default timezone('utc'::text, now()) not null;
+-- (reservations_touch_updated_at 트리거 생성)
+-- [필수] 예약 겹침 검사는 이 제약조건 위반(OverlapError)에 의존 (앱은 DB 로 겹침을 다시 확인하지 않음)
+-- create extension if not exists btree_gist;
+-- alter table reservations add constraint reservations_no_overlap
+--   exclude using gist (accommodation_name with =, daterange(checkin_date, checkout_date, '[)') with &&);
+-- create index if not exists sms_logs_sent_at_id_idx on sms_logs (sent_at desc, id desc);
+-- alter table sms_logs add column if not exists attempts integer not null default 1;
+-- sms_retry_queue 테이블/인덱스 생성
+-- create index if not exists sms_logs_sent_date_trigger_idx on sms_logs (sent_date, trigger_type);
+-- alter table sms_logs add column if not exists retried_at timestamp with time zone;
+-- alter table sms_logs add column if not exists updated_at timestamp with time zone default timezone('utc'::text, now()) not null;
+-- (sms_logs_touch_updated_at 트리거 생성)
+-- table_changes 테이블, count_table_changes 함수/트리거 생성
+-- alter table scheduled_messages add column if not exists claimed_until timestamp with time zone;